@@ -0,0 +1,325 @@
+"""
+Offline benchmarks for the program generators and API routes.
+
+    python bench.py run [--output results.json] [--quick]
+    python bench.py compare baseline.json results.json [--threshold 10]
+
+`run` times the generators directly (every template across several active
+lift subsets, both HLM variants and the 1RM table), then drives each
+/api/v1 route in-process through the ASGI app at several concurrency levels.
+Nothing listens on a port. The response cache and admission control are
+disabled while routes are measured, unless --cache or --admission is given.
+
+`compare` reports the change of every shared metric between two result files
+and exits with status 1 if any got worse by more than the threshold percent.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+from urllib.parse import urlencode
+
+import main
+
+TEMPLATES = {
+    "default": {"templates": ["default"]},
+    "fsl": {"templates": ["fsl"], "fsl_params": {"sets": 5, "reps": 5}},
+    "widowmaker": {"templates": ["widowmaker"]},
+    "pyramid": {"templates": ["pyramid"]},
+}
+
+LIFT_SUBSETS = {
+    "all": None,
+    "bench": ["bench"],
+    "squat+deadlift": ["squat", "deadlift"],
+}
+
+MAXES = {"squat": 140.0, "bench": 100.0, "deadlift": 180.0, "press": 60.0}
+
+HLM_STANDARD = {"squat": 140.0, "pull": 180.0, "press": 60.0, "medium_reduction": 0.1, "light_reduction": 0.2}
+
+HLM_ALTERNATE = {
+    "squat": 140.0, "primary_press": 60.0, "pull": 180.0,
+    "secondary_press": 90.0, "secondary_press_name": "Bench",
+    "medium_pull": 150.0, "medium_pull_name": "RDL",
+    "medium_reduction": 0.1, "light_reduction": 0.2,
+}
+
+EXPORT_PROGRAMS = (
+    [{"program": "wendler531", "params": dict(MAXES, squat=100.0 + i, **TEMPLATES["fsl"])} for i in range(40)]
+    + [{"program": "hlm_standard", "params": dict(HLM_STANDARD, squat=100.0 + i)} for i in range(30)]
+    + [{"program": "hlm_alternate", "params": dict(HLM_ALTERNATE, squat=100.0 + i)} for i in range(30)]
+)
+
+CONCURRENCY_LEVELS = [1, 8, 32]
+
+# Metrics where a larger value is an improvement
+HIGHER_IS_BETTER = {"rps"}
+
+
+def time_call(fn: Callable[[], object], repeat: int, number: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        samples.append((time.perf_counter() - start) / number * 1e6)
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+    }
+
+
+def micro_benchmarks(repeat: int, number: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+
+    for template, template_params in TEMPLATES.items():
+        for subset, lifts in LIFT_SUBSETS.items():
+            params = dict(MAXES, active_lifts=lifts, **template_params)
+            params["templates"] = [main.Template(t) for t in params["templates"]]
+            results[f"wendler531/{template}/{subset}"] = time_call(
+                lambda: main.Wendler531Generator(**params).generate(), repeat, number
+            )
+
+    athletes = [
+        dict(MAXES, squat=100.0 + i * 0.5, templates=[main.Template.FSL], fsl_params={"sets": 5, "reps": 5})
+        for i in range(1000)
+    ]
+    results["wendler531/batch/1000"] = time_call(
+        lambda: main.Wendler531Generator.generate_batch(athletes), max(repeat // 5, 1), 1
+    )
+
+    results["hlm/standard"] = time_call(
+        lambda: main.HLMStandardGenerator(**HLM_STANDARD).generate(), repeat, number
+    )
+    results["hlm/alternate"] = time_call(
+        lambda: main.HLMAlternatePressingGenerator(**HLM_ALTERNATE).generate(), repeat, number
+    )
+
+    for formula in main.ONE_RM_FORMULAS:
+        results[f"rm_table/{formula}"] = time_call(
+            lambda: main.generate_rm_table(main.calculate_1rm(100.0, 5, formula), 5, 100.0, formula),
+            repeat, number
+        )
+    return results
+
+
+class ASGIClient:
+    """Minimal in-process HTTP client that calls the ASGI app directly."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(self, method: str, path: str, body: bytes = b"") -> int:
+        path, _, query = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"bench"), (b"content-type", b"application/json")],
+            "client": ("127.0.0.1", 0),
+            "server": ("bench", 80),
+        }
+        sent = False
+        status = 0
+        finished = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if sent:
+                # Like a real client, only disconnect once the response is complete
+                await finished.wait()
+                return {"type": "http.disconnect"}
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                finished.set()
+
+        await self.app(scope, receive, send)
+        return status
+
+
+# GET routes take their parameters in the query string and have no body (None)
+ROUTES = {
+    "POST /api/v1/calcs/1rm": {"weight": 100.0, "reps": 5, "formula": "epley"},
+    "GET /api/v1/calcs/1rm?" + urlencode({"weight": 100.0, "reps": 5, "formula": "epley"}): None,
+    "POST /api/v1/calcs/1rm/bulk": {
+        "items": [{"weight": 60.0 + i % 100, "reps": 1 + i % 12, "formula": "brzycki"} for i in range(1000)],
+        "include_tables": True,
+    },
+    "POST /api/v1/programs/hlm/standard": HLM_STANDARD,
+    "GET /api/v1/programs/hlm/standard?" + urlencode(HLM_STANDARD): None,
+    "POST /api/v1/programs/hlm/alternate": HLM_ALTERNATE,
+    "GET /api/v1/programs/hlm/alternate?" + urlencode(HLM_ALTERNATE): None,
+    "POST /api/v1/programs/wendler531": dict(MAXES, **TEMPLATES["fsl"]),
+    "GET /api/v1/programs/wendler531?" + urlencode(dict(MAXES, templates="fsl", fsl_sets=5, fsl_reps=5)): None,
+    "POST /api/v1/programs/wendler531?format=columnar": dict(MAXES, **TEMPLATES["fsl"]),
+    "POST /api/v1/programs/wendler531?analytics=true": dict(MAXES, **TEMPLATES["fsl"]),
+    "POST /api/v1/programs/wendler531/batch": {"athletes": [dict(MAXES, squat=100.0 + i) for i in range(200)]},
+    "POST /api/v1/programs/wendler531/cycles": dict(MAXES, cycles=12),
+    "POST /api/v1/programs/wendler531/sweep": dict(
+        MAXES, squat={"start": 100.0, "stop": 200.0, "step": 2.5}, max_type="onerm",
+        tm_percentage={"start": 80.0, "stop": 95.0, "step": 0.5}
+    ),
+    "POST /api/v1/analytics/compare": {
+        "programs": [{"program": "wendler531", "params": dict(MAXES, templates=[template])} for template in TEMPLATES if template != "fsl"]
+        + [{"program": "hlm_standard", "params": HLM_STANDARD}, {"program": "hlm_alternate", "params": HLM_ALTERNATE}]
+    },
+    "POST /api/v1/programs/definitions/wendler531": {
+        "inputs": MAXES, "templates": ["fsl"], "template_params": {"fsl": TEMPLATES["fsl"]["fsl_params"]}
+    },
+    "POST /api/v1/programs/definitions/hlm_standard": {"inputs": HLM_STANDARD},
+    "POST /api/v1/exports/csv": {"programs": EXPORT_PROGRAMS},
+    "POST /api/v1/exports/html": {"programs": EXPORT_PROGRAMS},
+    "POST /api/v1/programs/hlm/standard/sweep": dict(
+        HLM_STANDARD, squat={"start": 100.0, "stop": 200.0, "step": 5.0},
+        medium_reduction={"start": 0.05, "stop": 0.15, "step": 0.01},
+        light_reduction={"start": 0.15, "stop": 0.30, "step": 0.01}
+    ),
+}
+
+
+async def drive(client: ASGIClient, method: str, path: str, body: bytes, requests: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            status = await client.request(method, path, body)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                raise RuntimeError(f"{method} {path} returned {status}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(q: float) -> float:
+        return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000, 3)
+
+    return {
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "rps": round(len(latencies) / elapsed, 1),
+    }
+
+
+def http_benchmarks(requests: int, concurrency_levels: List[int]) -> Dict[str, Dict[str, float]]:
+    client = ASGIClient(main.app)
+    results = {}
+    for route, payload in ROUTES.items():
+        method, path = route.split(" ", 1)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        # Heavy routes get fewer requests so a full run stays short
+        heavy = ("bulk", "batch", "cycles", "sweep", "compare", "exports")
+        count = max(requests // 10, 20) if any(word in path for word in heavy) else requests
+        asyncio.run(drive(client, method, path, body, min(count, 10), 1))  # warm up
+        for concurrency in concurrency_levels:
+            results[f"{route} c={concurrency}"] = asyncio.run(drive(client, method, path, body, count, concurrency))
+    return results
+
+
+def run(args):
+    if not args.cache:
+        main.response_cache.maxsize = 0
+        main.response_cache.clear()
+    if not args.admission:
+        # Bulk routes at c=32 would otherwise be shed with 503s
+        main.admission.enabled = False
+
+    repeat, number, requests = (5, 50, 200) if args.quick else (15, 200, 1000)
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "response_cache": args.cache,
+            "admission": args.admission,
+        },
+        "micro": micro_benchmarks(repeat, number),
+        "http": http_benchmarks(requests, CONCURRENCY_LEVELS),
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    for section in ("micro", "http"):
+        for name, metrics in results[section].items():
+            print(f"{name:<60} " + "  ".join(f"{k}={v}" for k, v in metrics.items()))
+    print(f"\nWrote {args.output}")
+
+
+def compare(args) -> int:
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    regressions = 0
+    for section in ("micro", "http"):
+        for name, metrics in current.get(section, {}).items():
+            base_metrics = baseline.get(section, {}).get(name)
+            if not base_metrics:
+                continue
+            for metric, value in metrics.items():
+                base = base_metrics.get(metric)
+                if not base:
+                    continue
+                change = (value - base) / base * 100
+                worse = -change if metric in HIGHER_IS_BETTER else change
+                flag = ""
+                if worse > args.threshold:
+                    flag = "  REGRESSION"
+                    regressions += 1
+                print(f"{name:<60} {metric:<10} {base:>12} -> {value:<12} {change:+7.1f}%{flag}")
+
+    print(f"\n{regressions} regression(s) above {args.threshold}%")
+    return 1 if regressions else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run the benchmarks and save the results")
+    run_parser.add_argument("--output", default="bench_results.json")
+    run_parser.add_argument("--quick", action="store_true", help="fewer iterations, for a smoke run")
+    run_parser.add_argument("--cache", action="store_true", help="leave the response cache enabled")
+    run_parser.add_argument("--admission", action="store_true", help="leave admission control enabled")
+
+    compare_parser = commands.add_parser("compare", help="compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0, help="allowed slowdown in percent")
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
@@ -1,12 +1,678 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import Body, FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.routing import APIRoute
 import uvicorn
 import os
-from typing import Dict, List, Optional
-from pydantic import BaseModel
+import ast
+import asyncio
+import bisect
+import cProfile
+import csv
+import datetime
+import hashlib
+import heapq
+import hmac
+import html
+import inspect
+import io
+import json
+import math
+import multiprocessing
+import operator
+import pstats
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, deque
+from functools import lru_cache, partial, wraps
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from itertools import count, groupby
+from dataclasses import asdict, dataclass, field
+from typing import Annotated, Any, Callable, Dict, Hashable, Iterator, List, Optional, Union
+from pydantic import BaseModel, Field, ValidationError
 from enum import Enum
+import numpy as np
 
-app = FastAPI()
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
+try:
+    import yaml
+except ImportError:  # optional, only needed for YAML program definitions
+    yaml = None
+
+# Metrics, exposed in Prometheus text format at /metrics
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, description: str, labelnames: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _labels(self, labels: tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{v}"' for k, v in zip(self.labelnames, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return super().render() + [f"{self.name}{self._labels(labels)} {value}" for labels, value in values]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: tuple, buckets: List[float]):
+        super().__init__(name, description, labelnames)
+        self.buckets = sorted(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        lines = super().render()
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {total}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
+REQUEST_DURATION = Histogram("iron_request_duration_seconds", "Total time spent handling a request.", ("route", "method"), LATENCY_BUCKETS)
+STAGE_DURATION = Histogram("iron_request_stage_seconds", "Time spent per request stage (validation, generation, serialization).", ("route", "stage"), LATENCY_BUCKETS)
+RESPONSE_SIZE = Histogram("iron_response_size_bytes", "Size of response bodies.", ("route",), SIZE_BUCKETS)
+REQUESTS = Counter("iron_requests_total", "Requests handled.", ("route", "method", "status"))
+REQUEST_ERRORS = Counter("iron_request_errors_total", "Requests that ended in an HTTP error.", ("route", "status"))
+IN_FLIGHT = Gauge("iron_requests_in_flight", "Requests currently being handled.", ("route",))
+GENERATOR_CALLS = Counter("iron_generator_calls_total", "Program and calculator generations, by program type and template.", ("program", "template"))
+
+METRICS: List[_Metric] = [REQUEST_DURATION, STAGE_DURATION, RESPONSE_SIZE, REQUESTS, REQUEST_ERRORS, IN_FLIGHT, GENERATOR_CALLS]
+
+# Per-request stage timings: {"start": ..., "route": ..., stage: seconds}
+_request_stages: ContextVar[Optional[dict]] = ContextVar("request_stages", default=None)
+
+def begin_handler():
+    # Everything between the request arriving and the handler body starting
+    # (body parsing, routing, pydantic validation) counts as validation.
+    stages = _request_stages.get()
+    if stages is not None and "validation" not in stages:
+        stages["validation"] = time.perf_counter() - stages["start"]
+
+@contextmanager
+def timed_stage(name: str):
+    stages = _request_stages.get()
+    if stages is None:
+        yield
+        return
+    begin_handler()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+def count_generation(program: str, template: str = "default", amount: int = 1):
+    GENERATOR_CALLS.inc((program, template), amount)
+
+# Request profiling. Off unless PROFILING_TOKEN or PROFILING_SAMPLE_RATE is
+# set; when off, routes are built exactly as without it. When on, a request
+# is profiled if it carries the token in X-Profile-Token, or at random at the
+# sample rate. cProfile runs on the event loop for the whole handler (body
+# parsing, validation, encoding) and separately on the threadpool thread that
+# runs a sync endpoint; the two are merged into one .prof file per request.
+# One request is profiled at a time per worker, as the event loop profile
+# also sees whatever else runs on the loop meanwhile. Streamed response
+# bodies are produced after the handler returns and are not included.
+# Saved profiles can only be read through the admin routes with the token.
+PROFILING_TOKEN = os.environ.get("PROFILING_TOKEN")
+PROFILING_SAMPLE_RATE = float(os.environ.get("PROFILING_SAMPLE_RATE", 0))
+PROFILING_DIR = os.environ.get("PROFILING_DIR", "request_profiles")
+PROFILING_MAX_FILES = int(os.environ.get("PROFILING_MAX_FILES", 100))
+PROFILING_MAX_BYTES = int(os.environ.get("PROFILING_MAX_BYTES", 50 * 1024 * 1024))
+
+class RequestProfile:
+    def __init__(self):
+        self.loop = cProfile.Profile()
+        self.worker = cProfile.Profile()
+        self.worker_ran = False
+
+    def run_endpoint(self, endpoint: Callable, *args, **kwargs):
+        self.worker_ran = True
+        return self.worker.runcall(endpoint, *args, **kwargs)
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.loop)
+        if self.worker_ran:
+            stats.add(self.worker)
+        return stats
+
+_request_profile: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+class RequestProfiler:
+    """Selects requests to profile and keeps their saved profiles in `directory`."""
+
+    NAME_PATTERN = re.compile(r"^[0-9]+-[0-9]+-[0-9a-f]{8}$")
+
+    def __init__(self, directory: str, token: Optional[str], sample_rate: float, max_files: int, max_bytes: int):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._busy = threading.Lock()
+
+    def authorized(self, request: Request) -> bool:
+        supplied = request.headers.get("x-profile-token")
+        return bool(self.token and supplied and hmac.compare_digest(supplied, self.token))
+
+    def _reason(self, request: Request) -> Optional[str]:
+        if self.authorized(request):
+            return "requested"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def wrap_endpoint(self, endpoint: Callable) -> Callable:
+        # Async endpoints run on the event loop, which is profiled already
+        if inspect.iscoroutinefunction(endpoint):
+            return endpoint
+
+        @wraps(endpoint)
+        def profiled_endpoint(*args, **kwargs):
+            profile = _request_profile.get()
+            if profile is None:
+                return endpoint(*args, **kwargs)
+            return profile.run_endpoint(endpoint, *args, **kwargs)
+        return profiled_endpoint
+
+    def wrap_handler(self, handler: Callable, route: str) -> Callable:
+        async def profiled_handler(request: Request) -> Response:
+            reason = self._reason(request)
+            if reason is None or not self._busy.acquire(blocking=False):
+                return await handler(request)
+
+            profile = RequestProfile()
+            token = _request_profile.set(profile)
+            status = 500
+            start = time.perf_counter()
+            profile.loop.enable()
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                raise
+            finally:
+                profile.loop.disable()
+                elapsed = time.perf_counter() - start
+                _request_profile.reset(token)
+                self._busy.release()
+                await run_in_threadpool(self.save, profile, {
+                    "route": route,
+                    "method": request.method,
+                    "path": request.url.path,
+                    "status": status,
+                    "reason": reason,
+                    "duration_ms": round(elapsed * 1000, 3),
+                    "time": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                    "pid": os.getpid()
+                })
+        return profiled_handler
+
+    def _path(self, name: str, extension: str) -> str:
+        if not self.NAME_PATTERN.match(name):
+            raise LookupError(name)
+        return os.path.join(self.directory, name + extension)
+
+    def save(self, profile: RequestProfile, meta: Dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{time.time_ns() // 1000}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        profile.stats().dump_stats(self._path(name, ".prof"))
+        with open(self._path(name, ".json"), "w") as f:
+            json.dump(meta, f)
+        self.rotate()
+        return name
+
+    def _names(self) -> List[str]:
+        # Oldest first; names start with the time in microseconds
+        try:
+            files = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        names = [f[:-len(".prof")] for f in files if f.endswith(".prof") and self.NAME_PATTERN.match(f[:-len(".prof")])]
+        return sorted(names, key=lambda name: int(name.split("-", 1)[0]))
+
+    def rotate(self):
+        names = self._names()
+        sizes = {}
+        for name in names:
+            try:
+                sizes[name] = sum(os.path.getsize(self._path(name, ext)) for ext in (".prof", ".json"))
+            except OSError:
+                sizes[name] = 0
+        total = sum(sizes.values())
+        while names and (len(names) > self.max_files or total > self.max_bytes):
+            name = names.pop(0)
+            total -= sizes[name]
+            for extension in (".prof", ".json"):
+                try:
+                    os.remove(self._path(name, extension))
+                except FileNotFoundError:
+                    pass
+
+    def meta(self, name: str) -> Dict:
+        try:
+            with open(self._path(name, ".json")) as f:
+                return {"name": name, **json.load(f)}
+        except FileNotFoundError:
+            raise LookupError(name)
+
+    def profiles(self) -> List[Dict]:
+        profiles = []
+        for name in reversed(self._names()):
+            try:
+                profiles.append(self.meta(name))
+            except LookupError:
+                continue  # rotated away by another worker meanwhile
+        return profiles
+
+    def prof_path(self, name: str) -> str:
+        path = self._path(name, ".prof")
+        if not os.path.exists(path):
+            raise LookupError(name)
+        return path
+
+    @staticmethod
+    def top_functions(stats: pstats.Stats, limit: int) -> List[Dict]:
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:limit]
+        return [
+            {
+                "function": pstats.func_std_string(func),
+                "calls": calls,
+                "primitive_calls": primitive_calls,
+                "total_time": round(total_time, 6),
+                "cumulative_time": round(cumulative_time, 6),
+            }
+            for func, (primitive_calls, calls, total_time, cumulative_time, _) in rows
+        ]
+
+    def summary(self, names: List[str], limit: int = 30) -> Dict:
+        """Top functions by cumulative time over the named profiles, merged."""
+        stats = None
+        for name in names:
+            try:
+                path = self.prof_path(name)
+                if stats is None:
+                    stats = pstats.Stats(path)
+                else:
+                    stats.add(path)
+            except (LookupError, FileNotFoundError):
+                continue
+        if stats is None:
+            return {"profiles": 0, "total_time": 0.0, "functions": []}
+        return {
+            "profiles": len(names),
+            "total_time": round(stats.total_tt, 6),
+            "functions": self.top_functions(stats, limit)
+        }
+
+request_profiler = (
+    RequestProfiler(PROFILING_DIR, PROFILING_TOKEN, PROFILING_SAMPLE_RATE, PROFILING_MAX_FILES, PROFILING_MAX_BYTES)
+    if PROFILING_TOKEN or PROFILING_SAMPLE_RATE > 0 else None
+)
+
+# Admission control. Every /api/v1 route passes a shared gate of
+# ADMISSION_CAPACITY slots before its handler runs, so requests wait (or are
+# turned away) here instead of piling up on the threadpool. Bulk routes
+# (batches, sweeps, exports, ...) can hold at most ADMISSION_BULK_SLOTS of
+# the slots and queue behind single-athlete requests; each also has its own
+# smaller gate. A request that finds its queue full, or is still waiting
+# after its lane's wait, gets a 503 with Retry-After. ADMISSION_CAPACITY=0
+# turns it off. Limits are per worker.
+ADMISSION_CAPACITY = int(os.environ.get("ADMISSION_CAPACITY", 32))
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", 256))
+ADMISSION_BULK_SLOTS = int(os.environ.get("ADMISSION_BULK_SLOTS", 8))
+ADMISSION_INTERACTIVE_WAIT = float(os.environ.get("ADMISSION_INTERACTIVE_WAIT", 2.0))
+ADMISSION_BULK_WAIT = float(os.environ.get("ADMISSION_BULK_WAIT", 10.0))
+ADMISSION_BULK_ROUTE_LIMIT = int(os.environ.get("ADMISSION_BULK_ROUTE_LIMIT", 2))
+ADMISSION_BULK_ROUTE_QUEUE = int(os.environ.get("ADMISSION_BULK_ROUTE_QUEUE", 16))
+# Per-route overrides, as JSON: {"/api/v1/programs/wendler531/batch": {"limit": 1, "queue": 4}}
+ADMISSION_ROUTE_LIMITS = json.loads(os.environ.get("ADMISSION_ROUTE_LIMITS") or "{}")
+
+ADMISSION_BULK_ROUTES = {
+    "/api/v1/calcs/1rm/bulk",
+    "/api/v1/programs/wendler531/cycles",
+    "/api/v1/programs/wendler531/batch",
+    "/api/v1/programs/wendler531/sweep",
+    "/api/v1/programs/hlm/standard/sweep",
+    "/api/v1/analytics/compare",
+    "/api/v1/jobs",
+    "/api/v1/exports/{export_format}",
+    "/api/v1/logs/ingest",
+}
+# Monitoring and admin routes must answer even when the app is saturated
+ADMISSION_EXEMPT_PREFIXES = ("/api/v1/admin/", "/api/v1/admission/", "/api/v1/cache/")
+
+ADMISSION_IN_USE = Gauge("iron_admission_in_use", "Admitted requests holding a slot, per gate.", ("gate",))
+ADMISSION_QUEUE_DEPTH = Gauge("iron_admission_queue_depth", "Requests waiting for admission, per gate.", ("gate",))
+ADMISSION_REJECTIONS = Counter("iron_admission_rejections_total", "Requests turned away by admission control.", ("route", "reason"))
+ADMISSION_WAIT = Histogram("iron_admission_wait_seconds", "Time spent waiting for admission.", ("route",), LATENCY_BUCKETS)
+METRICS.extend([ADMISSION_IN_USE, ADMISSION_QUEUE_DEPTH, ADMISSION_REJECTIONS, ADMISSION_WAIT])
+
+class Overloaded(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class AdmissionGate:
+    """
+    At most `limit` requests at once, with up to `queue_size` more waiting.
+
+    Waiters are admitted interactive first, then in arrival order. With
+    bulk_limit set, bulk requests hold at most that many slots, so the rest
+    stay free for interactive ones. Only used from the event loop.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int, bulk_limit: Optional[int] = None):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.bulk_limit = bulk_limit
+        self.in_use = 0
+        self.bulk_in_use = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "timeout": 0}
+        # (bulk, arrival, future, bulk) heap; futures of waiters that gave up stay until popped
+        self._waiters: List[tuple] = []
+        self._arrivals = count()
+
+    def _can_admit(self, bulk: bool) -> bool:
+        if self.in_use >= self.limit:
+            return False
+        return not (bulk and self.bulk_limit is not None and self.bulk_in_use >= self.bulk_limit)
+
+    def _take(self, bulk: bool):
+        self.in_use += 1
+        self.bulk_in_use += bulk
+        self.admitted += 1
+        ADMISSION_IN_USE.inc((self.name,))
+
+    def _leave_queue(self):
+        self.waiting -= 1
+        ADMISSION_QUEUE_DEPTH.dec((self.name,))
+
+    def _reject(self, reason: str):
+        self.rejected[reason] += 1
+        raise Overloaded(reason)
+
+    async def acquire(self, bulk: bool, timeout: float):
+        if self._can_admit(bulk):
+            self._take(bulk)
+            return
+        if self.waiting >= self.queue_size:
+            self._reject("queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (bulk, next(self._arrivals), future, bulk))
+        self.waiting += 1
+        ADMISSION_QUEUE_DEPTH.inc((self.name,))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Admitted just as the wait was abandoned; hand the slot on
+                self.release(bulk)
+            else:
+                future.cancel()
+                self._leave_queue()
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout")
+            raise
+
+    def release(self, bulk: bool):
+        self.in_use -= 1
+        self.bulk_in_use -= bulk
+        ADMISSION_IN_USE.dec((self.name,))
+        while self._waiters and self.in_use < self.limit:
+            _, _, future, waiter_bulk = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_admit(waiter_bulk):
+                break  # only bulk requests are waiting, and bulk is at its limit
+            heapq.heappop(self._waiters)
+            self._leave_queue()
+            self._take(waiter_bulk)
+            future.set_result(None)
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "bulk_limit": self.bulk_limit,
+            "in_use": self.in_use,
+            "bulk_in_use": self.bulk_in_use,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
+
+@dataclass(slots=True)
+class RoutePolicy:
+    route: str
+    bulk: bool
+    wait: float
+    gate: Optional[AdmissionGate]
+
+class AdmissionControl:
+    """The shared gate, and the per-route gates of bulk or configured routes."""
+
+    def __init__(self):
+        self.enabled = ADMISSION_CAPACITY > 0
+        self.shared = AdmissionGate("shared", ADMISSION_CAPACITY, ADMISSION_QUEUE_SIZE, ADMISSION_BULK_SLOTS)
+        self.routes: Dict[str, AdmissionGate] = {}
+
+    def policy(self, route: str) -> Optional[RoutePolicy]:
+        # Decided once per route, when the route is built
+        if not route.startswith("/api/v1/") or route.startswith(ADMISSION_EXEMPT_PREFIXES):
+            return None
+        bulk = route in ADMISSION_BULK_ROUTES
+        limits = ADMISSION_ROUTE_LIMITS.get(route)
+        if limits is None and bulk:
+            limits = {"limit": ADMISSION_BULK_ROUTE_LIMIT, "queue": ADMISSION_BULK_ROUTE_QUEUE}
+        gate = None
+        if limits:
+            gate = self.routes.setdefault(route, AdmissionGate(route, limits["limit"], limits.get("queue", 0)))
+        return RoutePolicy(route, bulk, ADMISSION_BULK_WAIT if bulk else ADMISSION_INTERACTIVE_WAIT, gate)
+
+    async def enter(self, policy: RoutePolicy) -> Callable[[], None]:
+        """Wait for a slot in the route's gate and the shared gate; returns the release function."""
+        start = time.perf_counter()
+        try:
+            if policy.gate is not None:
+                await policy.gate.acquire(policy.bulk, policy.wait)
+            try:
+                await self.shared.acquire(policy.bulk, max(start + policy.wait - time.perf_counter(), 0))
+            except BaseException:
+                if policy.gate is not None:
+                    policy.gate.release(policy.bulk)
+                raise
+        except Overloaded as e:
+            ADMISSION_REJECTIONS.inc((policy.route, e.reason))
+            raise HTTPException(
+                status_code=503,
+                detail="The server is busy. Retry later.",
+                headers={"Retry-After": str(math.ceil(policy.wait))}
+            )
+        ADMISSION_WAIT.observe((policy.route,), time.perf_counter() - start)
+
+        released = False
+
+        def release():
+            nonlocal released
+            if released:
+                return
+            released = True
+            self.shared.release(policy.bulk)
+            if policy.gate is not None:
+                policy.gate.release(policy.bulk)
+        return release
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "shared": self.shared.stats(),
+            "routes": {route: gate.stats() for route, gate in self.routes.items()}
+        }
+
+admission = AdmissionControl()
+
+async def _release_when_streamed(body_iterator, release: Callable[[], None]):
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        release()
+
+def release_after_response(response: Optional[Response], release: Callable[[], None]):
+    # A streamed body is produced after the handler returns, so its slot is
+    # held until the stream ends, or the response is dropped unsent
+    if isinstance(response, StreamingResponse):
+        response.body_iterator = _release_when_streamed(response.body_iterator, release)
+        weakref.finalize(response, release)
+    else:
+        release()
+
+class InstrumentedRoute(APIRoute):
+    """Route class that records request metrics for every endpoint, and applies admission control."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if request_profiler is not None:
+            endpoint = request_profiler.wrap_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        route = self.path_format
+        if request_profiler is not None and not route.startswith("/api/v1/admin/"):
+            handler = request_profiler.wrap_handler(handler, route)
+        policy = admission.policy(route)
+
+        async def instrumented_handler(request: Request) -> Response:
+            stages = {"start": time.perf_counter()}
+            token = _request_stages.set(stages)
+            IN_FLIGHT.inc((route,))
+            status = 500
+            release = response = None
+            try:
+                if policy is not None and admission.enabled:
+                    release = await admission.enter(policy)
+                response = await handler(request)
+                status = response.status_code
+                body = getattr(response, "body", None)
+                if body is not None:
+                    RESPONSE_SIZE.observe((route,), len(body))
+                return response
+            except HTTPException as e:
+                status = e.status_code
+                raise
+            except RequestValidationError:
+                status = 422
+                stages.setdefault("validation", time.perf_counter() - stages["start"])
+                raise
+            finally:
+                if release is not None:
+                    release_after_response(response, release)
+                IN_FLIGHT.dec((route,))
+                _request_stages.reset(token)
+                elapsed = time.perf_counter() - stages.pop("start")
+                REQUEST_DURATION.observe((route, request.method), elapsed)
+                REQUESTS.inc((route, request.method, str(status)))
+                if status >= 400:
+                    REQUEST_ERRORS.inc((route, str(status)))
+                for stage, seconds in stages.items():
+                    STAGE_DURATION.observe((route, stage), seconds)
+
+        return instrumented_handler
+
+def render_json(content: Any) -> bytes:
+    # Compact UTF-8 JSON, as FastAPI's default JSONResponse writes it
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers beyond 64 bits, which the stdlib encoder handles
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        with timed_stage("serialization"):
+            return render_json(content)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    job_manager.shutdown()
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+app.router.route_class = InstrumentedRoute
 
 # Define allowed origins (adjust as needed)
 origins = [
@@ -25,21 +691,75 @@ app.add_middleware(
     allow_headers=["*"],     # Allow all headers
 )
 
+# Compress large payloads (full programs, batches, exports) for clients that accept gzip; 0 disables
+GZIP_MINIMUM_SIZE = int(os.environ.get("GZIP_MINIMUM_SIZE", 2048))
+if GZIP_MINIMUM_SIZE:
+    app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=5)
+
+class JobRequest(BaseModel):
+    # Each entry is {"program": "wendler531" | "hlm_standard" | "hlm_alternate", "params": {...}}
+    requests: List[Dict[str, Any]]
+    chunk_size: int = 100
+
+class ExportRequest(BaseModel):
+    # Same entries as JobRequest
+    programs: List[Dict[str, Any]]
+
+class AnalyticsCompareRequest(BaseModel):
+    # Same entries as JobRequest, each with an optional "label"
+    programs: List[Dict[str, Any]]
+
+class OutputFormat(str, Enum):
+    NESTED = "nested"
+    COLUMNAR = "columnar"
+
 # Existing 1RM models and functions
 class OneRMRequest(BaseModel):
     weight: float
     reps: int
     formula: str
 
+class OneRMBulkRequest(BaseModel):
+    # Items are validated one at a time so a bad entry doesn't fail the batch
+    items: List[Dict[str, Any]]
+    include_tables: bool = False
+
+class WeightUnit(str, Enum):
+    KG = "kg"
+    LB = "lb"
+
+class Plate(BaseModel):
+    weight: float = Field(gt=0)
+    unit: WeightUnit = WeightUnit.KG
+    # Total plates of this size; they are loaded in pairs
+    count: int = Field(default=2, ge=0)
+
+class PlateInventory(BaseModel):
+    bar_weight: float = 20.0
+    bar_unit: WeightUnit = WeightUnit.KG
+    plates: List[Plate]
+
+class PlateRequest(BaseModel):
+    inventory: PlateInventory
+    weights: List[float]
+
 # New HLM models
-class HLMStandardRequest(BaseModel):
+class HLMStandardParams(BaseModel):
     squat: float = 100.0
     pull: float = 100.0
     press: float = 100.0
     medium_reduction: float
     light_reduction: float
 
-class HLMAlternateRequest(BaseModel):
+class HLMStandardRequest(HLMStandardParams):
+    plates: Optional[PlateInventory] = None
+
+class HLMStandardQuery(HLMStandardParams):
+    # GET query parameters
+    format: OutputFormat = OutputFormat.NESTED
+    analytics: bool = False
+
+class HLMAlternateParams(BaseModel):
     # Squats
     heavy_squat_name: str = "Squat"
     squat: float = 100.0
@@ -65,6 +785,14 @@ class HLMAlternateRequest(BaseModel):
     # Header Text
     header_text: Optional[str] = None
 
+class HLMAlternateRequest(HLMAlternateParams):
+    plates: Optional[PlateInventory] = None
+
+class HLMAlternateQuery(HLMAlternateParams):
+    # GET query parameters
+    format: OutputFormat = OutputFormat.NESTED
+    analytics: bool = False
+
 # New Wendler 5/3/1 models
 class Template(str, Enum):
     DEFAULT = "default"
@@ -87,6 +815,581 @@ class Wendler531Request(BaseModel):
     header_text: Optional[str] = None
     templates: Optional[List[Template]] = None
     fsl_params: Optional[dict] = None
+    plates: Optional[PlateInventory] = None
+
+class Wendler531Query(BaseModel):
+    # Wendler531Request as flat query parameters; fsl_params is split in two
+    squat: float
+    bench: float
+    deadlift: float
+    press: float
+    active_lifts: Optional[List[str]] = None
+    max_type: MaxType = MaxType.TRAINING_MAX
+    tm_percentage: float = 90.0
+    header_text: Optional[str] = None
+    templates: Optional[List[Template]] = None
+    fsl_sets: Optional[int] = None
+    fsl_reps: Optional[int] = None
+    format: OutputFormat = OutputFormat.NESTED
+    analytics: bool = False
+
+    def to_request(self) -> Wendler531Request:
+        params = self.model_dump(exclude={"fsl_sets", "fsl_reps", "format", "analytics"})
+        if self.fsl_sets is not None or self.fsl_reps is not None:
+            params["fsl_params"] = {"sets": self.fsl_sets, "reps": self.fsl_reps}
+        return Wendler531Request.model_validate(params)
+
+class Wendler531CyclesRequest(Wendler531Request):
+    cycles: int = 1
+    tm_increments: Optional[Dict[str, float]] = None
+    reset_every: Optional[int] = None
+    reset_percentage: float = 90.0
+    granularity: str = "cycle"
+
+class Wendler531BatchRequest(BaseModel):
+    # Items are validated one at a time so a bad athlete doesn't fail the batch
+    athletes: List[Dict[str, Any]]
+
+# What-if sweep models
+class SweepRange(BaseModel):
+    # Inclusive: stop is part of the range when it falls on a step
+    start: float
+    stop: float
+    step: float
+
+# A single value, an explicit list of values, or a range
+SweepValues = Union[float, List[float], SweepRange]
+
+class Wendler531SweepRequest(BaseModel):
+    squat: SweepValues
+    bench: SweepValues
+    deadlift: SweepValues
+    press: SweepValues
+    active_lifts: Optional[List[str]] = None
+    max_type: MaxType = MaxType.TRAINING_MAX
+    tm_percentage: SweepValues = 90.0
+    plates: Optional[PlateInventory] = None
+
+class HLMStandardSweepRequest(BaseModel):
+    squat: SweepValues = 100.0
+    pull: SweepValues = 100.0
+    press: SweepValues = 100.0
+    medium_reduction: SweepValues
+    light_reduction: SweepValues
+    plates: Optional[PlateInventory] = None
+
+# Declarative program models
+class DefinedProgramRequest(BaseModel):
+    # Training maxes by lift for percentage_cycle programs, the program's inputs for daily_schedule ones
+    inputs: Dict[str, Union[float, str, None]] = {}
+    templates: List[str] = []
+    template_params: Dict[str, Dict[str, Any]] = {}
+    header_text: Optional[str] = None
+    plates: Optional[PlateInventory] = None
+
+# Plate loading
+LB_TO_KG = 0.45359237
+
+class PlateIndex:
+    """
+    Every load a bar and plate inventory can make, with the fewest plates for each.
+
+    Loads are tracked in 10 g units. Plates go on in pairs, so each plate type
+    contributes count // 2 plates per side. Built once per inventory by a
+    bounded knapsack over per-side loads up to MAX_SIDE_KG; plates that could
+    only make heavier loads are left out. Snapping a weight afterwards is a
+    single table lookup.
+    """
+
+    UNITS_PER_KG = 100
+    MAX_SIDE_KG = 500
+
+    def __init__(self, bar_weight: float, plates: List[tuple]):
+        # plates: (label, weight in kg, plates per side)
+        self.bar_units = int(round(bar_weight * self.UNITS_PER_KG))
+        side_limit = self.MAX_SIDE_KG * self.UNITS_PER_KG
+        bundles = []  # (units, plate count, label)
+        for label, weight, per_side in plates:
+            units = int(round(weight * self.UNITS_PER_KG))
+            # Under 5 g rounds to nothing
+            if units <= 0 or units > side_limit:
+                continue
+            per_side = min(per_side, side_limit // units)
+            # Binary splitting turns "up to n of this plate" into 0/1 items
+            size = 1
+            while per_side > 0:
+                take = min(size, per_side)
+                bundles.append((units * take, take, label))
+                per_side -= take
+                size *= 2
+
+        max_side = min(sum(units for units, _, _ in bundles), side_limit)
+
+        unreachable = np.iinfo(np.int32).max
+        counts = np.full(max_side + 1, unreachable, dtype=np.int64)
+        counts[0] = 0
+        taken = []
+        for units, plate_count, _ in bundles:
+            with_bundle = np.full_like(counts, unreachable)
+            with_bundle[units:] = counts[:-units] + plate_count
+            better = with_bundle < counts
+            counts = np.where(better, with_bundle, counts)
+            taken.append(better)
+
+        self._bundles = bundles
+        self._taken = taken
+        self.sides = np.flatnonzero(counts < unreachable)
+        self.totals = self.bar_units + 2 * self.sides
+
+        # Nearest loadable total for every target from 0 up to the heaviest load;
+        # ties go to the lighter load
+        targets = np.arange(self.totals[-1] + 1)
+        above = np.minimum(np.searchsorted(self.totals, targets), len(self.totals) - 1)
+        below = np.maximum(above - 1, 0)
+        use_below = (targets - self.totals[below]) <= (self.totals[above] - targets)
+        self._nearest = np.where(use_below & (self.totals[below] <= targets), below, above)
+
+        self._breakdowns: Dict[int, List[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bar_weight(self) -> float:
+        return self.bar_units / self.UNITS_PER_KG
+
+    def snap(self, weights: np.ndarray) -> tuple:
+        """Return (loadable weights in kg, index of each load) for an array of target weights."""
+        targets = np.clip(np.rint(np.asarray(weights, dtype=float) * self.UNITS_PER_KG), 0, len(self._nearest) - 1)
+        index = self._nearest[targets.astype(np.int64)]
+        return np.round(self.totals[index] / self.UNITS_PER_KG, 2), index
+
+    def plates(self, index: int) -> List[str]:
+        """Plates to load on each side for the load at `index`, heaviest first."""
+        with self._lock:
+            breakdown = self._breakdowns.get(index)
+            if breakdown is None:
+                remaining = int(self.sides[index])
+                labelled = []
+                for bundle, taken in zip(reversed(self._bundles), reversed(self._taken)):
+                    if remaining and taken[remaining]:
+                        units, count, label = bundle
+                        labelled.extend([(units // count, label)] * count)
+                        remaining -= units
+                breakdown = self._breakdowns[index] = [label for _, label in sorted(labelled, reverse=True)]
+            return breakdown
+
+    def plates_table(self, index: np.ndarray) -> list:
+        # Same nesting as `index`, with a plate list in place of each entry
+        if index.ndim == 0:
+            return self.plates(int(index))
+        return [self.plates_table(row) for row in index]
+
+def _plate_label(weight: float, unit: str) -> str:
+    return f"{weight:g}{unit}"
+
+@lru_cache(maxsize=64)
+def _build_plate_index(bar_weight: float, plates: tuple) -> PlateIndex:
+    return PlateIndex(bar_weight, list(plates))
+
+def get_plate_index(inventory) -> PlateIndex:
+    """Cached PlateIndex for a PlateInventory (or its dict form)."""
+    # Plain strings for the units, whether this came from a request model, a
+    # model_dump() (enum members) or a JSON job payload
+    if not isinstance(inventory, BaseModel):
+        inventory = PlateInventory.model_validate(inventory)
+    inventory = inventory.model_dump(mode="json")
+
+    def to_kg(weight: float, unit: str) -> float:
+        return weight * LB_TO_KG if unit == WeightUnit.LB.value else weight
+
+    bar_weight = to_kg(inventory["bar_weight"], inventory["bar_unit"])
+
+    per_side: Dict[tuple, int] = {}
+    for plate in inventory["plates"]:
+        key = (_plate_label(plate["weight"], plate["unit"]), to_kg(plate["weight"], plate["unit"]))
+        per_side[key] = per_side.get(key, 0) + plate["count"] // 2
+    plates = tuple(sorted((label, weight, count) for (label, weight), count in per_side.items()))
+    return _build_plate_index(round(bar_weight, 4), plates)
+
+# Declarative program definitions. Each file in PROGRAM_DEFINITIONS_DIR (and
+# in EXTRA_PROGRAM_DEFINITIONS_DIR, if set) describes one program. Files are
+# compiled once at import into a plan; requests only bind the athlete's numbers.
+PROGRAM_DEFINITIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+EXTRA_PROGRAM_DEFINITIONS_DIR = os.environ.get("EXTRA_PROGRAM_DEFINITIONS_DIR")
+
+_EXPRESSION_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.IfExp, ast.BoolOp, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.USub, ast.UAdd, ast.And, ast.Or,
+)
+
+def parse_expression(source: str, names) -> ast.expr:
+    """
+    Parse an arithmetic expression over the named inputs.
+
+    Allows numbers, names, + - * /, parentheses, `a if b else c`, and/or.
+    Without a conditional it works elementwise on arrays too.
+    """
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression {source!r}: {e.msg}")
+    for node in ast.walk(tree):
+        if not isinstance(node, _EXPRESSION_NODES):
+            raise ValueError(f"Unsupported syntax in expression {source!r}: {type(node).__name__}")
+        if isinstance(node, ast.Name) and node.id not in names:
+            raise ValueError(f"Unknown name {node.id!r} in expression {source!r}")
+        if isinstance(node, ast.Constant) and (isinstance(node.value, bool) or not isinstance(node.value, (int, float))):
+            raise ValueError(f"Only numbers are allowed in expression {source!r}")
+    return tree.body
+
+def compile_expression(node: ast.expr) -> Callable[[Dict[str, Any]], Any]:
+    if isinstance(node, ast.Name):
+        # A bare input, as in most conditions
+        return operator.itemgetter(node.id)
+    code = compile(ast.fix_missing_locations(ast.Expression(node)), "<program definition>", "eval")
+    no_builtins = {"__builtins__": {}}
+    return lambda values: eval(code, no_builtins, values)
+
+def rep_count(reps: str) -> int:
+    # An AMRAP set ("5+") counts its minimum, a range ("1-5") its top
+    return int(reps.rstrip("+").rpartition("-")[2])
+
+@dataclass(slots=True)
+class TemplateParam:
+    """A number a supplemental template takes from template_params, and its bounds."""
+    type: str = "int"
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+    TYPES = {"int": (int,), "number": (int, float)}
+
+    def __post_init__(self):
+        if self.type not in self.TYPES:
+            raise ValueError(f"Unknown template param type {self.type!r}. Use any of: {', '.join(self.TYPES)}")
+
+    def check(self, label: str, value: Any) -> Any:
+        if isinstance(value, bool) or not isinstance(value, self.TYPES[self.type]) or not math.isfinite(value):
+            raise ValueError(f"{label} must be {'an integer' if self.type == 'int' else 'a number'}.")
+        if (self.min is not None and value < self.min) or (self.max is not None and value > self.max):
+            raise ValueError(f"{label} must be between {self.min} and {self.max}.")
+        return value
+
+@dataclass(slots=True)
+class SupplementalSpec:
+    """
+    Supplemental work that reuses main-set weights: one block at a main set's
+    weight, or (with rows) a list of rows at the weights of the given sets.
+    sets and reps describe the block's volume unless params give them.
+    """
+    template: str
+    set: Optional[int] = None
+    params: Dict[str, TemplateParam] = field(default_factory=dict)
+    skip_deload: bool = False
+    rows: Optional[List[tuple]] = None  # (0-based set, reps suffix)
+    sets: int = 1
+    reps: Optional[int] = None  # the main set's reps if not given
+
+    def check_params(self, values: Dict) -> Dict:
+        missing = [name for name in self.params if name not in values]
+        if missing:
+            raise ValueError(f"When {self.template} is selected, template_params.{self.template} must give {', '.join(missing)}.")
+        return {name: param.check(f"{self.template.upper()} {name}", values[name]) for name, param in self.params.items()}
+
+    def nested(self, week: Dict, weights: List[float], plates: Optional[List], params: Dict) -> Any:
+        if self.rows is not None:
+            rows = []
+            for i, suffix in self.rows:
+                row = {"reps": week["reps"][i] + suffix, "weight": weights[i]}
+                if plates:
+                    row["plates"] = plates[i]
+                rows.append(row)
+            return rows
+        output = {name: params[name] for name in self.params}
+        output["weight"] = weights[self.set]
+        if plates:
+            output["plates"] = plates[self.set]
+        return output
+
+    def columnar(self, weeks: List[Dict], weights: List, params: Dict) -> Dict:
+        if self.rows is not None:
+            return {
+                "reps": [[week["reps"][i] + suffix for i, suffix in self.rows] for week in weeks],
+                "weights": [[[lift[i] for i, _ in self.rows] for lift in week_weights] for week_weights in weights]
+            }
+        output = {name: params[name] for name in self.params}
+        output["weights"] = [
+            [lift[self.set] for lift in week_weights] if not (self.skip_deload and week["deload"]) else None
+            for week, week_weights in zip(weeks, weights)
+        ]
+        return output
+
+    def set_table(self, weeks: List[Dict], weights: np.ndarray, reps: np.ndarray, params: Dict) -> tuple:
+        # weeks x lifts x sets weights and weeks x sets reps -> (week, lift, weight, sets, reps) arrays
+        week_index, lift_index = np.indices(weights.shape[:2])
+        if self.rows is not None:
+            columns = [i for i, _ in self.rows]
+            shape = weights.shape[:2] + (len(columns),)
+            return (
+                np.broadcast_to(week_index[..., np.newaxis], shape),
+                np.broadcast_to(lift_index[..., np.newaxis], shape),
+                weights[:, :, columns],
+                np.ones(shape),
+                np.broadcast_to(reps[:, np.newaxis, columns], shape)
+            )
+        keep = np.array([not (self.skip_deload and week["deload"]) for week in weeks])
+        block_reps = params.get("reps", self.reps)
+        if block_reps is None:
+            block_reps = reps[:, np.newaxis, self.set]
+        block_reps = np.broadcast_to(block_reps, weights.shape[:2])
+        return (
+            week_index[keep],
+            lift_index[keep],
+            weights[keep][:, :, self.set],
+            np.full(block_reps[keep].shape, params.get("sets", self.sets)),
+            block_reps[keep]
+        )
+
+class PercentageCyclePlan:
+    """
+    A compiled percentage_cycle definition: weeks of sets at fixed
+    percentages of each lift's training max, and the supplemental templates.
+    """
+    kind = "percentage_cycle"
+
+    def __init__(self, definition: Dict):
+        self.definition = definition
+        self.name = definition["name"]
+        self.title = definition.get("title", self.name)
+        self.lifts = list(definition["lifts"])
+        self.rounding = float(definition.get("rounding", 2.5))
+        self.accessory_pairings = dict(definition.get("accessory_pairings", {}))
+
+        self.weeks = []
+        for number, week in enumerate(definition["weeks"], 1):
+            reps, percentages = list(week["reps"]), [float(p) for p in week["percentages"]]
+            if len(reps) != len(percentages):
+                raise ValueError(f"{week['name']}: reps and percentages differ in length")
+            self.weeks.append({
+                "week": number,
+                "name": week["name"],
+                "reps": reps,
+                "percentages": percentages,
+                "deload": bool(week.get("deload", False))
+            })
+        set_counts = {len(week["reps"]) for week in self.weeks}
+        if len(set_counts) != 1:
+            raise ValueError("Every week needs the same number of sets")
+        sets = set_counts.pop()
+
+        # weeks x sets, and the same as displayed percentages
+        self.percentage_grid = np.array([week["percentages"] for week in self.weeks])
+        self.rep_counts = np.array([[rep_count(reps) for reps in week["reps"]] for week in self.weeks])
+        self.display_percentages = [[percent * 100 for percent in week["percentages"]] for week in self.weeks]
+
+        self.supplemental = []
+        for spec in definition.get("supplemental", []):
+            rows = None
+            if "rows" in spec:
+                rows = [(row["set"] - 1, row.get("reps_suffix", "")) for row in spec["rows"]]
+            used = [i for i, _ in rows] if rows is not None else [spec["set"] - 1]
+            if any(not 0 <= i < sets for i in used):
+                raise ValueError(f"Supplemental template {spec['template']!r} refers to a set that does not exist")
+            self.supplemental.append(SupplementalSpec(
+                template=spec["template"],
+                set=spec["set"] - 1 if rows is None else None,
+                params={name: TemplateParam(**param) for name, param in spec.get("params", {}).items()},
+                skip_deload=bool(spec.get("skip_deload", False)),
+                rows=rows,
+                sets=int(spec.get("sets", 1)),
+                reps=spec.get("reps")
+            ))
+        self.templates = ["default"] + [spec.template for spec in self.supplemental]
+
+    def supplemental_for(self, templates) -> Optional[SupplementalSpec]:
+        # Supplemental templates are mutually exclusive; the first one listed wins
+        for spec in self.supplemental:
+            if spec.template in templates:
+                return spec
+        return None
+
+    def target_weights(self, training_maxes: np.ndarray) -> np.ndarray:
+        # athletes x lifts -> athletes x weeks x lifts x sets, before rounding.
+        # Supplemental rows reuse these, as they are the same percentage of the
+        # same training max.
+        return training_maxes[:, np.newaxis, :, np.newaxis] * self.percentage_grid[np.newaxis, :, np.newaxis, :]
+
+    def round_weights(self, weights: np.ndarray) -> np.ndarray:
+        return np.round(weights / self.rounding) * self.rounding
+
+    def describe(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "title": self.title,
+            "lifts": self.lifts,
+            "weeks": [week["name"] for week in self.weeks],
+            "templates": self.templates,
+            "template_params": {
+                spec.template: {name: asdict(param) for name, param in spec.params.items()}
+                for spec in self.supplemental if spec.params
+            }
+        }
+
+@dataclass(slots=True)
+class ScheduleLine:
+    """
+    One line of a daily schedule. The exercise is either fixed or taken from
+    an input; with a fixed exercise the text around the weight is built once.
+    """
+    intensity: str
+    exercise: Optional[str]
+    exercise_input: Optional[str]
+    scheme: str
+    weight: str
+    note: str
+    prefix: Optional[str]
+    suffix: str
+
+@dataclass(slots=True)
+class ConditionalLine:
+    when: Callable[[Dict[str, Any]], Any]
+    then: Any
+    otherwise: Any
+
+class SchedulePlan:
+    """
+    A compiled daily_schedule definition: named weights derived from the
+    inputs, and each day's lines using them.
+    """
+    kind = "daily_schedule"
+
+    def __init__(self, definition: Dict):
+        self.definition = definition
+        self.name = definition["name"]
+        self.title = definition.get("title", self.name)
+        self.rounding = float(definition.get("rounding", 2.5))
+        self.inputs = dict(definition.get("inputs", {}))
+        self.weight_expressions = {
+            key: parse_expression(expression, self.inputs) for key, expression in definition["weights"].items()
+        }
+        # All weights in one evaluation, as a dict display
+        self._weights = compile_expression(ast.Dict(
+            keys=[ast.Constant(key) for key in self.weight_expressions],
+            values=list(self.weight_expressions.values())
+        ))
+        self.days = {
+            day: [self._compile_line(line) for line in lines]
+            for day, lines in definition["days"].items()
+        }
+
+    def _compile_line(self, line: Dict):
+        if "when" in line:
+            return ConditionalLine(
+                compile_expression(parse_expression(line["when"], self.inputs)),
+                self._compile_line(line["then"]),
+                self._compile_line(line["else"])
+            )
+        if line["weight"] not in self.weight_expressions:
+            raise ValueError(f"Unknown weight {line['weight']!r}")
+        exercise, exercise_input, prefix = line["exercise"], None, None
+        if exercise.startswith("$"):
+            exercise, exercise_input = None, exercise[1:]
+            if exercise_input not in self.inputs:
+                raise ValueError(f"Unknown input {exercise_input!r}")
+        else:
+            prefix = f"{line['intensity']} {exercise} {line['scheme']} - "
+        note = line.get("note", "")
+        return ScheduleLine(
+            intensity=line["intensity"],
+            exercise=exercise,
+            exercise_input=exercise_input,
+            scheme=line["scheme"],
+            weight=line["weight"],
+            note=note,
+            prefix=prefix,
+            suffix=f" kg, {note}" if note else " kg"
+        )
+
+    def calculate_weights(self, values: Dict[str, Any]) -> Dict:
+        # Unrounded; works elementwise on arrays too when no weight is conditional
+        return self._weights(values)
+
+    def day_weights(self) -> Dict[str, List[str]]:
+        # The weights each day uses, in order, for lines whose weight does not depend on a condition
+        days = {}
+        for day, lines in self.days.items():
+            keys = []
+            for line in lines:
+                while isinstance(line, ConditionalLine):
+                    if line.then.weight != line.otherwise.weight:
+                        raise ValueError(f"{self.name}: {day} uses a different weight depending on the inputs")
+                    line = line.then
+                keys.append(line.weight)
+            days[day] = keys
+        return days
+
+    def bind(self, values: Dict[str, Any], weights: Dict[str, float]) -> tuple:
+        """Resolve the schedule for these inputs and rounded weights: (entries, schedule)."""
+        entries = {}
+        schedule = {}
+        for day, lines in self.days.items():
+            day_entries = []
+            day_schedule = []
+            for line in lines:
+                while isinstance(line, ConditionalLine):
+                    line = line.then if line.when(values) else line.otherwise
+                weight = weights[line.weight]
+                if line.prefix is None:
+                    exercise = values[line.exercise_input]
+                    prefix = f"{line.intensity} {exercise} {line.scheme} - "
+                else:
+                    exercise, prefix = line.exercise, line.prefix
+                day_entries.append(ScheduleEntry(line.intensity, exercise, line.scheme, weight, line.note))
+                day_schedule.append(f"{prefix}{weight}{line.suffix}")
+            entries[day] = day_entries
+            schedule[day] = day_schedule
+        return entries, schedule
+
+    def describe(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "title": self.title,
+            "inputs": self.inputs,
+            "weights": list(self.weight_expressions),
+            "days": list(self.days)
+        }
+
+PLAN_KINDS = {plan.kind: plan for plan in (PercentageCyclePlan, SchedulePlan)}
+
+def load_program_definition(path: str) -> Dict:
+    with open(path, "rb") as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise RuntimeError(f"PyYAML is needed to load {path}")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def load_program_plans(directories: List[str]) -> Dict[str, Any]:
+    plans = {}
+    for directory in directories:
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith((".json", ".yaml", ".yml")):
+                continue
+            path = os.path.join(directory, filename)
+            definition = load_program_definition(path)
+            try:
+                if definition.get("kind") not in PLAN_KINDS:
+                    raise ValueError(f"Unknown kind {definition.get('kind')!r}")
+                plan = PLAN_KINDS[definition["kind"]](definition)
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid program definition {path}: {e!r}") from e
+            if plan.name in plans:
+                raise ValueError(f"Program {plan.name!r} in {path} is already defined")
+            plans[plan.name] = plan
+    return plans
+
+PROGRAM_PLANS = load_program_plans(
+    [PROGRAM_DEFINITIONS_DIR] + ([EXTRA_PROGRAM_DEFINITIONS_DIR] if EXTRA_PROGRAM_DEFINITIONS_DIR else [])
+)
+WENDLER531_PLAN = PROGRAM_PLANS["wendler531"]
 
 class Wendler531Generator:
     TEMPLATE_PERCENTAGES = {
@@ -96,12 +1399,13 @@ class Wendler531Generator:
         Template.PYRAMID: 90.0
     }
 
-    STRUCTURE_CORE = [
-        {"week": 1, "name": "Week 1 (5/5/5+)", "reps": ["5", "5", "5+"], "percentages": [0.65, 0.75, 0.85]},
-        {"week": 2, "name": "Week 2 (3/3/3+)", "reps": ["3", "3", "3+"], "percentages": [0.70, 0.80, 0.90]},
-        {"week": 3, "name": "Week 3 (5/3/1+)", "reps": ["5", "3", "1+"], "percentages": [0.75, 0.85, 0.95]},
-        {"week": 4, "name": "Week 4 (Deload)", "reps": ["5", "5", "5"], "percentages": [0.40, 0.50, 0.60]}
-    ]
+    # Weeks, percentages and supplemental templates come from programs/wendler531.json
+    PLAN = WENDLER531_PLAN
+    STRUCTURE_CORE = PLAN.weeks
+    LIFTS = PLAN.lifts
+
+    # weeks x sets percentage grid, used by the batch path
+    PERCENTAGE_GRID = PLAN.percentage_grid
 
     def __init__(self, 
                  squat: float = 100.0, 
@@ -113,9 +1417,12 @@ class Wendler531Generator:
                  tm_percentage: float = 90.0,
                  header_text: Optional[str] = None,
                  templates: Optional[List[Template]] = None,
-                 fsl_params: Optional[dict] = None):
+                 fsl_params: Optional[dict] = None,
+                 plates: Optional[dict] = None):
         
         self.header_text = header_text
+        # Snap set weights to what this inventory can load instead of 2.5 kg steps
+        self.plates = get_plate_index(plates) if plates else None
         self.templates = templates or []
         self.active_lifts = active_lifts or ['squat', 'bench', 'deadlift', 'press']
         self.max_type = max_type
@@ -139,7 +1446,17 @@ class Wendler531Generator:
             return maxes
         
         tm_percentage = self.tm_percentage or self._get_template_percentage()
-        return {lift: max_value * (tm_percentage / 100) for lift, max_value in maxes.items()}
+        training_maxes = {lift: self._training_max(max_value, tm_percentage) for lift, max_value in maxes.items()}
+        if not all(math.isfinite(tm) for tm in training_maxes.values()):
+            # Weights are rounded in bulk now, which passes infinity through;
+            # fail as rounding each weight with round() did
+            raise OverflowError("cannot convert float infinity to integer")
+        return training_maxes
+
+    @staticmethod
+    def _training_max(max_value, tm_percentage):
+        # Works elementwise on arrays too, for sweeps
+        return max_value * (tm_percentage / 100)
 
     def _get_template_percentage(self) -> float:
         if not self.templates:
@@ -171,83 +1488,397 @@ class Wendler531Generator:
         return {'sets': sets, 'reps': reps}
 
     def _round_weight(self, weight: float) -> float:
-        round_value = 2.5
+        round_value = self.PLAN.rounding
         return round(weight / round_value) * round_value
 
+    @classmethod
+    def _round_weights(cls, weights: np.ndarray) -> np.ndarray:
+        return cls.PLAN.round_weights(weights)
+
+    @classmethod
+    def _target_weights(cls, training_maxes: np.ndarray) -> np.ndarray:
+        # athletes x lifts -> athletes x weeks x lifts x sets, before rounding
+        return cls.PLAN.target_weights(training_maxes)
+
+    @classmethod
+    def _set_weights(cls, training_maxes: np.ndarray) -> np.ndarray:
+        return cls._round_weights(cls._target_weights(training_maxes))
+
+    def _loaded_weights(self, targets: np.ndarray) -> tuple:
+        # weeks x lifts x sets targets -> (weights, plates) for a program
+        weights, index = self.plates.snap(targets)
+        return weights.tolist(), self.plates.plates_table(index)
+
+    def build_program(self, maxes: Optional[dict] = None) -> "Wendler531Program":
+        maxes = self.maxes if maxes is None else maxes
+        training_maxes = np.array([list(maxes.values())], dtype=float)
+        if self.plates:
+            weights, plates = self._loaded_weights(self._target_weights(training_maxes)[0])
+        else:
+            weights, plates = self._set_weights(training_maxes)[0].tolist(), None
+        return Wendler531Program(
+            header_text=self.header_text,
+            training_maxes=maxes,
+            templates=self.templates,
+            fsl_params=getattr(self, "fsl_params", None),
+            weights=weights,
+            plates=plates
+        )
+
     def generate(self) -> Dict:
-        output = {
+        return self.build_program().to_dict()
+
+    def generate_columnar(self) -> Dict:
+        return self.build_program().to_columnar()
+
+    def analytics(self) -> Dict:
+        return self.build_program().analytics(self.tm_percentage or self._get_template_percentage())
+
+    DEFAULT_TM_INCREMENTS = {'squat': 5.0, 'bench': 2.5, 'deadlift': 5.0, 'press': 2.5}
+
+    def generate_cycles(self,
+                        cycles: int = 1,
+                        tm_increments: Optional[Dict[str, float]] = None,
+                        reset_every: Optional[int] = None,
+                        reset_percentage: float = 90.0,
+                        granularity: str = "cycle") -> Iterator[Dict]:
+        """
+        Plan several consecutive cycles, yielding records one at a time.
+
+        After each cycle every training max goes up by its increment. With
+        reset_every set, every Nth cycle is followed by a reset to
+        reset_percentage of the current training maxes instead. Yields a header
+        record, then one record per cycle or per week depending on granularity.
+        Arguments are validated up front, before anything is yielded.
+        """
+        if not (1 <= cycles <= 100):
+            raise ValueError("Cycles must be between 1 and 100.")
+        if granularity not in ("cycle", "week"):
+            raise ValueError("Granularity must be 'cycle' or 'week'.")
+        if reset_every is not None and reset_every < 1:
+            raise ValueError("reset_every must be at least 1.")
+        if not (0 < reset_percentage <= 100):
+            raise ValueError("reset_percentage must be between 0 and 100.")
+
+        increments = dict(self.DEFAULT_TM_INCREMENTS)
+        if tm_increments:
+            unknown = set(tm_increments) - set(increments)
+            if unknown:
+                raise ValueError(f"Unknown lifts in tm_increments: {sorted(unknown)}")
+            increments.update(tm_increments)
+
+        return self._iter_cycles(cycles, increments, reset_every, reset_percentage, granularity)
+
+    def _iter_cycles(self, cycles, increments, reset_every, reset_percentage, granularity) -> Iterator[Dict]:
+        yield {
+            "type": "header",
             "header_text": self.header_text,
-            "training_maxes": self.maxes,
-            "templates": [t.value for t in self.templates],
-            "program": []
+            "templates": template_names(self.templates),
+            "cycles": cycles,
+            "accessory_pairings": dict(ACCESSORY_PAIRINGS)
+        }
+
+        maxes = dict(self.maxes)
+        for cycle in range(1, cycles + 1):
+            weeks = self.build_program(maxes).weeks()
+            if granularity == "week":
+                yield {"type": "cycle", "cycle": cycle, "training_maxes": maxes}
+                for week_output in weeks:
+                    yield {"type": "week", "cycle": cycle, **week_output}
+            else:
+                yield {
+                    "type": "cycle",
+                    "cycle": cycle,
+                    "training_maxes": maxes,
+                    "program": weeks
+                }
+
+            if reset_every and cycle % reset_every == 0:
+                maxes = {lift: tm * reset_percentage / 100 for lift, tm in maxes.items()}
+            else:
+                maxes = {lift: tm + increments[lift] for lift, tm in maxes.items()}
+
+    @classmethod
+    def build_batch(cls, athletes: List[dict]) -> List[Dict]:
+        """
+        Build programs for many athletes at once.
+
+        Each entry of `athletes` holds the constructor arguments for one athlete.
+        Returns one result per athlete, in order: {"program": Wendler531Program}
+        on success or {"error": ...} if that athlete's parameters were rejected.
+        Set weights for every athlete come from a single array computation.
+        """
+        results: List[Dict] = []
+        generators = []
+        for params in athletes:
+            try:
+                generators.append(cls(**params))
+                results.append({})
+            except Exception as e:
+                results.append({"error": str(e)})
+
+        if not generators:
+            return results
+
+        # athletes x lifts, NaN where a lift is not active
+        training_maxes = np.array(
+            [[g.maxes.get(lift, np.nan) for lift in cls.LIFTS] for g in generators]
+        )
+        targets = cls._target_weights(training_maxes)
+        weights = cls._round_weights(targets).tolist()
+
+        lift_index = {lift: i for i, lift in enumerate(cls.LIFTS)}
+        generated = iter(range(len(generators)))
+        for result in results:
+            if "error" in result:
+                continue
+            a = next(generated)
+            generator = generators[a]
+            columns = [lift_index[lift] for lift in generator.maxes]
+            if generator.plates:
+                program_weights, plates = generator._loaded_weights(targets[a][:, columns])
+            else:
+                program_weights, plates = [[week[l] for l in columns] for week in weights[a]], None
+            result["program"] = Wendler531Program(
+                header_text=generator.header_text,
+                training_maxes=generator.maxes,
+                templates=generator.templates,
+                fsl_params=getattr(generator, "fsl_params", None),
+                weights=program_weights,
+                plates=plates
+            )
+        return results
+
+    @classmethod
+    def sweep(cls,
+              maxes: Dict[str, np.ndarray],
+              tm_percentages: np.ndarray,
+              max_type: MaxType = MaxType.TRAINING_MAX,
+              plates: Optional[dict] = None) -> Dict:
+        """
+        Top-set weights for every combination of tm_percentage and max.
+
+        Lifts are independent of each other, so each lift gets its own
+        tm_percentages x maxes grid rather than a cross product with the other
+        lifts' maxes. top_sets is tm_percentages x maxes x weeks.
+        """
+        if max_type == MaxType.TRAINING_MAX and len(tm_percentages) > 1:
+            raise ValueError("tm_percentage only applies when max_type is onerm.")
+        if np.any(tm_percentages <= 0) or np.any(tm_percentages > 100):
+            raise ValueError("tm_percentage must be between 0 and 100.")
+        plate_index = get_plate_index(plates) if plates else None
+
+        lifts = {}
+        for lift, lift_maxes in maxes.items():
+            if max_type == MaxType.TRAINING_MAX:
+                training_maxes = lift_maxes[np.newaxis, :]
+            else:
+                training_maxes = cls._training_max(lift_maxes[np.newaxis, :], tm_percentages[:, np.newaxis])
+            # Last set of each week; the grid has a single "lift" column here
+            targets = cls._target_weights(training_maxes.reshape(-1, 1))[:, :, 0, -1]
+            top_sets = plate_index.snap(targets)[0] if plate_index else cls._round_weights(targets)
+            lifts[lift] = {
+                "maxes": lift_maxes.tolist(),
+                "training_maxes": training_maxes.tolist(),
+                "top_sets": top_sets.reshape(training_maxes.shape + (-1,)).tolist()
+            }
+
+        return {
+            "max_type": max_type.value,
+            "tm_percentages": tm_percentages.tolist() if max_type == MaxType.ONERM else None,
+            "weeks": [week['name'] for week in cls.STRUCTURE_CORE],
+            "combinations": sum(len(lift["maxes"]) * len(tm_percentages) for lift in lifts.values()),
+            "lifts": lifts
         }
 
-        # Add accessory pairings
-        output["accessory_pairings"] = {
-            "Squat": "Chins",
-            "OHP": "Dips",
-            "Deadlift": "Rows"
+    @classmethod
+    def generate_batch(cls, athletes: List[dict]) -> List[Dict]:
+        """
+        Generate programs for many athletes at once.
+
+        Same as build_batch, but with each program rendered the way generate()
+        renders it.
+        """
+        results = cls.build_batch(athletes)
+        for result in results:
+            if "program" in result:
+                result["program"] = result["program"].to_dict()
+        return results
+
+ACCESSORY_PAIRINGS = WENDLER531_PLAN.accessory_pairings
+
+def template_names(templates: list) -> List[str]:
+    # Template members for 5/3/1, plain names for other defined programs
+    return [getattr(t, "value", t) for t in templates]
+
+@dataclass(slots=True)
+class Wendler531Program:
+    """
+    A generated 5/3/1 cycle, or a cycle of another percentage_cycle plan.
+
+    Set weights are held as a weeks x lifts x sets table in the order of
+    training_maxes. Supplemental rows are read from the same table, as are
+    the plates to load per side when the program was built for an inventory.
+    """
+    header_text: Optional[str]
+    training_maxes: Dict[str, float]
+    templates: List[Template]
+    fsl_params: Optional[dict]
+    weights: List[List[List[float]]]
+    plates: Optional[List[List[List[List[str]]]]] = None
+    plan: Optional[PercentageCyclePlan] = None
+    # Parameters per supplemental template; 5/3/1 only has fsl_params
+    template_params: Optional[Dict[str, dict]] = None
+
+    def _plan(self) -> PercentageCyclePlan:
+        return self.plan or WENDLER531_PLAN
+
+    def _supplemental(self) -> tuple:
+        supplemental = self._plan().supplemental_for(self.templates)
+        if supplemental is None or not supplemental.params:
+            return supplemental, {}
+        params = self.template_params if self.template_params is not None else {Template.FSL.value: self.fsl_params}
+        return supplemental, params.get(supplemental.template) or {}
+
+    def to_dict(self) -> Dict:
+        return {
+            "header_text": self.header_text,
+            "training_maxes": self.training_maxes,
+            "templates": template_names(self.templates),
+            "program": self.weeks(),
+            "accessory_pairings": dict(self._plan().accessory_pairings)
         }
 
-        for week in self.STRUCTURE_CORE:
+    def weeks(self) -> List[Dict]:
+        plan = self._plan()
+        supplemental, params = self._supplemental()
+        weeks = []
+        plates = self.plates or [None] * len(self.weights)
+        for week, percentages, week_weights, week_plates in zip(plan.weeks, plan.display_percentages, self.weights, plates):
             week_output = {
                 "name": week['name'],
                 "lifts": []
             }
+            with_supplemental = supplemental and not (supplemental.skip_deload and week["deload"])
 
-            for lift, training_max in self.maxes.items():
+            for l, (lift, lift_weights) in enumerate(zip(self.training_maxes, week_weights)):
+                lift_plates = week_plates[l] if week_plates else None
                 lift_output = {
                     "name": lift.title(),
-                    "sets": []
-                }
-
-                for i, (percent, reps) in enumerate(zip(week['percentages'], week['reps'])):
-                    weight = self._round_weight(training_max * percent)
-                    lift_output["sets"].append({
-                        "set_number": i + 1,
-                        "reps": reps,
-                        "weight": self._round_weight(weight),
-                        "percentage": percent * 100
-                    })
-
-                if Template.FSL in self.templates and week["week"] != 4:
-                    lift_output["fsl"] = {
-                        "sets": self.fsl_params['sets'],
-                        "reps": self.fsl_params['reps'],
-                        "weight": self._round_weight(training_max * week['percentages'][0])
-                    }
-                elif Template.WIDOWMAKER in self.templates and week["week"] != 4:
-                    lift_output["widowmaker"] = {
-                        "weight": self._round_weight(training_max * week['percentages'][0])
-                    }
-                elif Template.PYRAMID in self.templates:
-                    lift_output["pyramid"] = [
+                    "sets": [
                         {
-                            "reps": week['reps'][1],
-                            "weight": self._round_weight(training_max * week['percentages'][1])
-                        },
-                        {
-                            "reps": week['reps'][0] + "+",
-                            "weight": self._round_weight(training_max * week['percentages'][0])
+                            "set_number": i + 1,
+                            "reps": reps,
+                            "weight": weight,
+                            "percentage": percentage
                         }
+                        for i, (percentage, reps, weight) in enumerate(zip(percentages, week['reps'], lift_weights))
                     ]
+                }
+                if lift_plates:
+                    for set_output, set_plates in zip(lift_output["sets"], lift_plates):
+                        set_output["plates"] = set_plates
+
+                if with_supplemental:
+                    lift_output[supplemental.template] = supplemental.nested(week, lift_weights, lift_plates, params)
 
                 week_output["lifts"].append(lift_output)
-            output["program"].append(week_output)
+            weeks.append(week_output)
+        return weeks
+
+    def to_columnar(self) -> Dict:
+        # Parallel arrays instead of per-set objects: weeks x sets for reps and
+        # percentages, weeks x lifts x sets for weights.
+        plan = self._plan()
+        structure = plan.weeks
+        output = {
+            "header_text": self.header_text,
+            "training_maxes": self.training_maxes,
+            "templates": template_names(self.templates),
+            "accessory_pairings": dict(plan.accessory_pairings),
+            "weeks": [week['name'] for week in structure],
+            "lifts": [lift.title() for lift in self.training_maxes],
+            "reps": [week['reps'] for week in structure],
+            "percentages": [list(percentages) for percentages in plan.display_percentages],
+            "weights": self.weights
+        }
+        if self.plates:
+            # Supplemental rows load the same as the main set they reuse
+            output["plates"] = self.plates
 
+        supplemental, params = self._supplemental()
+        if supplemental:
+            output[supplemental.template] = supplemental.columnar(structure, self.weights, params)
         return output
 
+    def analytics(self, tm_percentage: float = 90.0) -> Dict:
+        """
+        Volume and intensity of the cycle, main and supplemental sets together.
+        Relative intensity is against each lift's 1RM, taken as its training
+        max / tm_percentage.
+        """
+        plan = self._plan()
+        weights = np.array(self.weights, dtype=float)
+        week_index, lift_index, _ = np.indices(weights.shape)
+        parts = [(week_index, lift_index, weights, np.ones(weights.shape), np.broadcast_to(plan.rep_counts[:, np.newaxis, :], weights.shape))]
+        supplemental, params = self._supplemental()
+        if supplemental:
+            parts.append(supplemental.set_table(plan.weeks, weights, plan.rep_counts, params))
+        table = [np.concatenate([np.ravel(part[i]) for part in parts]) for i in range(5)]
+        one_rms = np.array(list(self.training_maxes.values()), dtype=float) * 100 / tm_percentage
+        return volume_analytics(
+            "weeks", [week["name"] for week in plan.weeks], [lift.title() for lift in self.training_maxes],
+            *table, one_rms, weeks=len(plan.weeks)
+        )
+
 # HLM Classes
-class HLMStandardGenerator:
-    TEMPLATE_NAME = "HLM Standard 5s"
-    ROUNDING_VALUE = 2.5
+@dataclass(slots=True)
+class ScheduleEntry:
+    intensity: str
+    exercise: Optional[str]
+    scheme: str
+    weight: float
+    note: str = ""
 
-    def __init__(self, 
-        squat: float = 100.0, 
-        pull: float = 100.0, 
+    def describe(self) -> str:
+        description = f"{self.intensity} {self.exercise} {self.scheme} - {self.weight} kg"
+        return f"{description}, {self.note}" if self.note else description
+
+def columnar_schedule(entries: Dict[str, List[ScheduleEntry]]) -> Dict[str, list]:
+    # One parallel array per field, one element per exercise
+    flat = [(day, entry) for day, day_entries in entries.items() for entry in day_entries]
+    return {
+        "days": [day for day, _ in flat],
+        "intensities": [entry.intensity for _, entry in flat],
+        "exercises": [entry.exercise for _, entry in flat],
+        "schemes": [entry.scheme for _, entry in flat],
+        "weights": [entry.weight for _, entry in flat],
+        "notes": [entry.note for _, entry in flat],
+    }
+
+def round_hlm_weights(weights: Dict[str, float], rounding_value: float, plates: Optional[PlateIndex]) -> tuple:
+    """Round HLM weights to rounding_value, or snap them to the inventory with their plates."""
+    if not plates:
+        return {key: round(weight / rounding_value) * rounding_value for key, weight in weights.items()}, None
+    snapped, index = plates.snap(np.array(list(weights.values())))
+    return (
+        dict(zip(weights, snapped.tolist())),
+        {key: plates.plates(i) for key, i in zip(weights, index.tolist())}
+    )
+
+class HLMStandardGenerator:
+    # Weights and schedule come from programs/hlm_standard.json
+    PLAN = PROGRAM_PLANS["hlm_standard"]
+    TEMPLATE_NAME = PLAN.title
+    ROUNDING_VALUE = PLAN.rounding
+
+    def __init__(self, 
+        squat: float = 100.0, 
+        pull: float = 100.0, 
         press: float = 100.0,
         medium_reduction: float = 0.10,
-        light_reduction: float = 0.20
+        light_reduction: float = 0.20,
+        plates: Optional[dict] = None
         ):
 
         self.weights = {
@@ -261,37 +1892,77 @@ class HLMStandardGenerator:
             "light": light_reduction,
         }
 
-        self.calculated_weights = {
-            "heavy_squat": squat,
-            "medium_squat": self.weights["squat"] * (1 - self.reductions["medium"]),
-            "light_squat": self.weights["squat"] * (1 - self.reductions["light"]),
-            "heavy_pull": pull,
-            "medium_pull": self.weights["pull"] * (1 - self.reductions["medium"]),
-            "light_pull": self.weights["pull"] * (1 - self.reductions["light"]),
-            "heavy_press": press,
-            "medium_press": self.weights["press"] * (1 - self.reductions["medium"]),
-            "light_press": self.weights["press"] * (1 - self.reductions["light"]),
-        }
+        self.calculated_weights = self.calculate_weights(squat, pull, press, medium_reduction, light_reduction)
+
+        self.plates = get_plate_index(plates) if plates else None
+        self.calculated_weights, self.plate_breakdown = round_hlm_weights(
+            self.calculated_weights, self.ROUNDING_VALUE, self.plates
+        )
+
+        # No line of this schedule depends on the inputs, only on the weights
+        self.entries, self.schedule = self.PLAN.bind({}, self.calculated_weights)
+
+    @classmethod
+    def calculate_weights(cls, squat, pull, press, medium_reduction, light_reduction) -> Dict:
+        # Unrounded; works elementwise on arrays too, for sweeps
+        return cls.PLAN.calculate_weights({
+            "squat": squat,
+            "pull": pull,
+            "press": press,
+            "medium_reduction": medium_reduction,
+            "light_reduction": light_reduction,
+        })
+
+    # The weights each day of the schedule uses, in order
+    DAY_WEIGHTS = PLAN.day_weights()
+
+    @classmethod
+    def sweep(cls, axes: Dict[str, np.ndarray], plates: Optional[dict] = None) -> Dict:
+        """
+        Per-day working weights and loads for the full cross product of the axes.
 
-        for key in self.calculated_weights:
-            self.calculated_weights[key] = round(self.calculated_weights[key] / self.ROUNDING_VALUE) * self.ROUNDING_VALUE
-
-        self.schedule = {
-            "Mon": [
-                f"Heavy Squat 1x1-5 - {self.calculated_weights['heavy_squat']} kg, 4x5 Backoff",
-                f"Medium Press 4x5 - {self.calculated_weights['medium_press']} kg",
-                f"Light Pull 3x3-5 - {self.calculated_weights['light_pull']} kg"
-            ],
-            "Wed": [
-                f"Light Squat 3x5 - {self.calculated_weights['light_squat']} kg",
-                f"Light Press 3x5 - {self.calculated_weights['light_press']} kg",
-                f"Heavy Pull 2x1-5 - {self.calculated_weights['heavy_pull']} kg"
-            ],
-            "Fri": [
-                f"Medium Squat 4x5 - {self.calculated_weights['medium_squat']} kg",
-                f"Heavy Press 1x1-5 - {self.calculated_weights['heavy_press']} kg, 4x5 Backoff",
-                f"Medium Pull 3x4-5 - {self.calculated_weights['medium_pull']} kg"
-            ]
+        `axes` maps each of squat, pull, press, medium_reduction and
+        light_reduction to its values. Each exercise's weight only depends on
+        its lift and (for medium/light) one reduction, so it is returned over
+        just those axes. A day's load, the sum of its three weights, is returned
+        for every combination, flattened in axis order (last axis fastest).
+        """
+        reductions = np.concatenate([axes["medium_reduction"], axes["light_reduction"]])
+        if np.any(reductions < 0) or np.any(reductions >= 1):
+            raise ValueError("Reductions must be between 0 and 1.")
+        names = ["squat", "pull", "press", "medium_reduction", "light_reduction"]
+        shape = tuple(len(axes[name]) for name in names)
+        # Sparse grids: each weight keeps only the axes it varies along
+        grids = np.meshgrid(*(axes[name] for name in names), indexing="ij", sparse=True)
+        weights = cls.calculate_weights(*grids)
+
+        plate_index = get_plate_index(plates) if plates else None
+        for key, targets in weights.items():
+            if plate_index:
+                weights[key] = plate_index.snap(targets)[0]
+            else:
+                weights[key] = np.round(targets / cls.ROUNDING_VALUE) * cls.ROUNDING_VALUE
+
+        days = {}
+        for day, keys in cls.DAY_WEIGHTS.items():
+            load = sum(np.broadcast_to(weights[key], shape) for key in keys)
+            days[day] = {
+                "exercises": [
+                    {
+                        "name": key.replace("_", " ").title(),
+                        "axes": [name for name, size in zip(names, weights[key].shape) if size > 1],
+                        "weights": weights[key].squeeze().tolist()
+                    }
+                    for key in keys
+                ],
+                "loads": load.reshape(-1).tolist()
+            }
+
+        return {
+            "axes": {name: axes[name].tolist() for name in names},
+            "shape": list(shape),
+            "combinations": int(np.prod(shape)),
+            "days": days
         }
 
     def generate(self) -> Dict:
@@ -301,11 +1972,23 @@ class HLMStandardGenerator:
             "reductions": self.reductions,
             "schedule": self.schedule
         }
+        if self.plates:
+            output["plates"] = self.plate_breakdown
         return output
 
+    def generate_columnar(self) -> Dict:
+        output = self.generate()
+        output["schedule"] = columnar_schedule(self.entries)
+        return output
+
+    def analytics(self) -> Dict:
+        return schedule_analytics(self.entries)
+
 class HLMAlternatePressingGenerator:
-    TEMPLATE_NAME = "HLM 5s (Alternate Pressing)"
-    ROUNDING_VALUE = 2.5
+    # Weights and schedule come from programs/hlm_alternate.json
+    PLAN = PROGRAM_PLANS["hlm_alternate"]
+    TEMPLATE_NAME = PLAN.title
+    ROUNDING_VALUE = PLAN.rounding
 
     def __init__(self,
         heavy_squat_name: str = "Squat",
@@ -323,6 +2006,7 @@ class HLMAlternatePressingGenerator:
         medium_reduction: float = 0.10,
         light_reduction: float = 0.20,
         header_text: Optional[str] = None,
+        plates: Optional[dict] = None,
         ):
 
         self.header_text = header_text
@@ -349,41 +2033,30 @@ class HLMAlternatePressingGenerator:
             "light": light_reduction,
         }
 
-        self.calculated_weights = {
-            "heavy_squat": self.weights['heavy_squat'],
-            "medium_squat": self.weights["heavy_squat"] * (1 - self.reductions["medium"]),
-            "light_squat": self.weights["heavy_squat"] * (1 - self.reductions["light"]),
-            "heavy_press": self.weights['primary_press'],
-            "medium_press": self.weights["primary_press"] * (1 - self.reductions["medium"]),
-            "light_press": self.weights['secondary_press'] if self.weights['secondary_press'] else self.weights['primary_press'] * (1 - self.reductions["light"]),
-            "heavy_pull": self.weights['heavy_pull'],
-            "medium_pull": self.weights['medium_pull'] if self.weights['medium_pull'] else self.weights["heavy_pull"] * (1 - self.reductions["medium"]),
-            "light_pull": self.weights['light_pull'] if self.weights['light_pull'] else self.weights["heavy_pull"] * (1 - self.reductions["light"]),
+        inputs = {
+            "heavy_squat_name": heavy_squat_name,
+            "squat": squat,
+            "primary_press": primary_press,
+            "primary_press_name": primary_press_name,
+            "secondary_press": secondary_press,
+            "secondary_press_name": secondary_press_name,
+            "pull": pull,
+            "heavy_pull_name": heavy_pull_name,
+            "medium_pull": medium_pull,
+            "medium_pull_name": medium_pull_name,
+            "light_pull": light_pull,
+            "light_pull_name": light_pull_name,
+            "medium_reduction": medium_reduction,
+            "light_reduction": light_reduction,
         }
+        self.calculated_weights = self.PLAN.calculate_weights(inputs)
 
-        for key in self.calculated_weights:
-            self.calculated_weights[key] = round(self.calculated_weights[key] / self.ROUNDING_VALUE) * self.ROUNDING_VALUE
-
-        self.schedule = {
-            "Mon": [
-                f"Heavy Squat 1x1-5 - {self.calculated_weights['heavy_squat']} kg, 4x5 Backoff",
-                f"Medium {self.exercise_names['primary_press']} 4x5 - {self.calculated_weights['medium_press']} kg",
-                f"Light {self.exercise_names['light_pull']} 3x3-5 - {self.calculated_weights['light_pull']} kg" if self.weights['light_pull'] else
-                    f"Light {self.exercise_names['heavy_pull']} 3x3-5 - {self.calculated_weights['light_pull']} kg"
-            ],
-            "Wed": [
-                f"Light Squat 3x5 - {self.calculated_weights['light_squat']} kg",
-                f"Heavy {self.exercise_names['secondary_press']} 1x5 - {self.calculated_weights['light_press']} kg, 4x5 Backoff" if self.weights['secondary_press'] else 
-                    f"Light {self.exercise_names['primary_press']} 3x5 - {self.calculated_weights['light_press']} kg",
-                f"Heavy {self.exercise_names['heavy_pull']} 2x1-5 - {self.calculated_weights['heavy_pull']} kg"
-            ],
-            "Fri": [
-                f"Medium Squat 4x5 - {self.calculated_weights['medium_squat']} kg",
-                f"Heavy {self.exercise_names['primary_press']} 1x1-5 - {self.calculated_weights['heavy_press']} kg, 4x5 Backoff",
-                f"Medium {self.exercise_names['medium_pull']} 3x4-5 - {self.calculated_weights['medium_pull']} kg" if self.weights['medium_pull'] else
-                    f"Medium {self.exercise_names['heavy_pull']} 3x4-5 - {self.calculated_weights['medium_pull']} kg"
-            ]
-        }
+        self.plates = get_plate_index(plates) if plates else None
+        self.calculated_weights, self.plate_breakdown = round_hlm_weights(
+            self.calculated_weights, self.ROUNDING_VALUE, self.plates
+        )
+
+        self.entries, self.schedule = self.PLAN.bind(inputs, self.calculated_weights)
 
     def generate(self) -> Dict:
         output = {
@@ -394,88 +2067,1643 @@ class HLMAlternatePressingGenerator:
             "header_text": self.header_text,
             "schedule": self.schedule
         }
+        if self.plates:
+            output["plates"] = self.plate_breakdown
         return output
 
+    def generate_columnar(self) -> Dict:
+        output = self.generate()
+        output["schedule"] = columnar_schedule(self.entries)
+        return output
+
+    def analytics(self) -> Dict:
+        return schedule_analytics(self.entries)
+
+# Running defined programs
+def build_percentage_program(plan: PercentageCyclePlan, request: DefinedProgramRequest) -> Wendler531Program:
+    unknown = set(request.inputs) - set(plan.lifts)
+    if unknown:
+        raise ValueError(f"Unknown lifts for {plan.name}: {sorted(unknown)}. Use any of: {', '.join(plan.lifts)}")
+    maxes = {lift: request.inputs[lift] for lift in plan.lifts if lift in request.inputs}
+    if not maxes:
+        raise ValueError(f"Give a training max for at least one of: {', '.join(plan.lifts)}")
+    if any(not isinstance(tm, float) or tm <= 0 for tm in maxes.values()):
+        raise ValueError("Training maxes must be positive numbers.")
+
+    unknown = set(request.templates) - set(plan.templates)
+    if unknown:
+        raise ValueError(f"Unknown templates for {plan.name}: {sorted(unknown)}. Use any of: {', '.join(plan.templates)}")
+    selected = [spec for spec in plan.supplemental if spec.template in request.templates]
+    if len(selected) > 1:
+        raise ValueError(f"Templates {[spec.template for spec in selected]} are mutually exclusive. Only one can be selected.")
+    template_params = {}
+    if selected and selected[0].params:
+        template = selected[0].template
+        template_params[template] = selected[0].check_params(request.template_params.get(template, {}))
+
+    targets = plan.target_weights(np.array([list(maxes.values())]))[0]
+    if request.plates:
+        plates = get_plate_index(request.plates)
+        snapped, index = plates.snap(targets)
+        weights, plate_table = snapped.tolist(), plates.plates_table(index)
+    else:
+        weights, plate_table = plan.round_weights(targets).tolist(), None
+    return Wendler531Program(
+        header_text=request.header_text,
+        training_maxes=maxes,
+        templates=list(request.templates),
+        fsl_params=None,
+        weights=weights,
+        plates=plate_table,
+        plan=plan,
+        template_params=template_params
+    )
+
+def generate_schedule_program(plan: SchedulePlan, request: DefinedProgramRequest, columnar: bool = False, analytics: bool = False) -> Dict:
+    unknown = set(request.inputs) - set(plan.inputs)
+    if unknown:
+        raise ValueError(f"Unknown inputs for {plan.name}: {sorted(unknown)}. Use any of: {', '.join(plan.inputs)}")
+    if request.templates or request.template_params:
+        raise ValueError(f"{plan.name} has no templates.")
+    values = {**plan.inputs, **request.inputs}
+    plates = get_plate_index(request.plates) if request.plates else None
+    try:
+        weights, plate_breakdown = round_hlm_weights(plan.calculate_weights(values), plan.rounding, plates)
+    except TypeError:
+        raise ValueError(f"Inputs used in {plan.name}'s weights must be numbers.")
+    entries, schedule = plan.bind(values, weights)
+    output = {
+        "template_name": plan.title,
+        "inputs": values,
+        "header_text": request.header_text,
+        "schedule": columnar_schedule(entries) if columnar else schedule
+    }
+    if plates:
+        output["plates"] = plate_breakdown
+    if analytics:
+        output["analytics"] = schedule_analytics(entries)
+    return output
+
+def generate_defined_program(plan, request: DefinedProgramRequest, columnar: bool = False, analytics: bool = False) -> Dict:
+    if isinstance(plan, PercentageCyclePlan):
+        program = build_percentage_program(plan, request)
+        output = program.to_columnar() if columnar else program.to_dict()
+        if analytics:
+            output["analytics"] = program.analytics()
+        return output
+    return generate_schedule_program(plan, request, columnar, analytics)
+
+# Program analytics
+# INOL is reps / (100 - %1RM), which has no value at 100%
+INOL_MAX_INTENSITY = 0.99
+ANALYTICS_MAX_PROGRAMS = int(os.environ.get("ANALYTICS_MAX_PROGRAMS", 1000))
+
+def _volume_metrics(row: list) -> Dict:
+    sets, reps, tonnage, average_intensity, inol = row
+    return {
+        "sets": sets,
+        "reps": reps,
+        "tonnage": tonnage,
+        "average_intensity": average_intensity if reps else None,
+        "inol": inol
+    }
+
+def volume_analytics(period_key: str, periods: List[str], lifts: List[str],
+                     period: np.ndarray, lift: np.ndarray, weight: np.ndarray, sets: np.ndarray, reps: np.ndarray,
+                     one_rms: np.ndarray, weeks: int = 1) -> Dict:
+    """
+    Volume metrics for a flat table of prescribed work, one row per group of
+    identical sets, given as parallel arrays (period and lift are indexes).
+
+    Gives sets, reps, tonnage (weight x reps), average relative intensity
+    (percent of 1RM, weighted by reps) and INOL, for the whole program, per
+    week on average, per lift, and per period with its lifts.
+    """
+    total_reps = sets * reps
+    lift_one_rms = one_rms[lift]
+    intensity = np.divide(weight, lift_one_rms, out=np.zeros(weight.shape), where=lift_one_rms > 0)
+    inol = total_reps / (100 - 100 * np.minimum(intensity, INOL_MAX_INTENSITY))
+
+    # periods x lifts x sums, in one pass
+    cells = np.zeros((len(periods), len(lifts), 5))
+    np.add.at(cells, (period, lift), np.stack([sets, total_reps, weight * total_reps, intensity * total_reps, inol], axis=-1))
+    total = cells.sum(axis=(0, 1))
+    # Every group's sums as one table: total, per week, lifts, periods, then each period's lifts
+    sums = np.concatenate([[total, total / weeks], cells.sum(axis=0), cells.sum(axis=1), cells.reshape(-1, 5)])
+    sums[:, 3] = np.divide(sums[:, 3], sums[:, 1], out=np.zeros(len(sums)), where=sums[:, 1] > 0) * 100
+    metrics = [_volume_metrics(row) for row in np.round(sums, 2).tolist()]
+
+    by_lift = metrics[2:2 + len(lifts)]
+    by_period = metrics[2 + len(lifts):2 + len(lifts) + len(periods)]
+    by_cell = metrics[2 + len(lifts) + len(periods):]
+    return {
+        "total": metrics[0],
+        "per_week": metrics[1],
+        "lifts": dict(zip(lifts, by_lift)),
+        period_key: [
+            {
+                "name": name,
+                **period_metrics,
+                "lifts": {
+                    lift_name: cell
+                    for lift_name, cell in zip(lifts, by_cell[p * len(lifts):(p + 1) * len(lifts)]) if cell["reps"]
+                }
+            }
+            for p, (name, period_metrics) in enumerate(zip(periods, by_period))
+        ]
+    }
+
+def parse_scheme(scheme: str) -> tuple:
+    sets, _, reps = scheme.partition("x")
+    try:
+        return int(sets), rep_count(reps)
+    except ValueError:
+        raise ValueError(f"Cannot read sets x reps from scheme {scheme!r}")
+
+def schedule_analytics(entries: Dict[str, List[ScheduleEntry]]) -> Dict:
+    """
+    Volume and intensity of one week of a daily schedule, by day and
+    exercise. Each exercise's 1RM is the highest Epley estimate from its
+    prescribed sets. Backoff sets given only as notes are not counted.
+    """
+    flat = [(d, entry) for d, day_entries in enumerate(entries.values()) for entry in day_entries]
+    exercises = list(dict.fromkeys(str(entry.exercise) for _, entry in flat))
+    exercise_index = {name: i for i, name in enumerate(exercises)}
+    schemes = np.array([parse_scheme(entry.scheme) for _, entry in flat], dtype=float).reshape(-1, 2)
+    period = np.array([d for d, _ in flat], dtype=int)
+    lift = np.array([exercise_index[str(entry.exercise)] for _, entry in flat], dtype=int)
+    weight = np.array([entry.weight for _, entry in flat], dtype=float)
+    sets, reps = schemes[:, 0], schemes[:, 1]
+
+    one_rms = np.zeros(len(exercises))
+    np.maximum.at(one_rms, lift, ONE_RM_FORMULAS["epley"].one_rm_array(weight, reps))
+    return volume_analytics("days", list(entries), exercises, period, lift, weight, sets, reps, one_rms)
+
+def render_program(generator, format: OutputFormat, analytics: bool = False) -> Dict:
+    output = generator.generate_columnar() if format == OutputFormat.COLUMNAR else generator.generate()
+    if analytics:
+        output["analytics"] = generator.analytics()
+    return output
+
+def analytics_key(analytics: bool) -> str:
+    # Cache and ETag key suffix; empty without analytics so existing keys stay the same
+    return ":analytics" if analytics else ""
+
+COMPARE_METRICS = ("sets", "reps", "tonnage", "average_intensity", "inol")
+
+def compare_analytics(items: List[Dict[str, Any]]) -> Dict:
+    """
+    Analytics for many programs side by side.
+
+    Each item is a {"program", "params", "label"} entry. Returns one result per
+    item, in order, and a comparison of the programs' average weeks with one
+    list per metric, in the order of the successful results.
+    """
+    results = []
+    for index, item in enumerate(items):
+        label = item.get("label") or f"{item.get('program')} #{index}"
+        try:
+            results.append({"index": index, "status_code": 200, "label": label, "analytics": build_generator(item).analytics()})
+        except ValidationError as e:
+            results.append({"index": index, "status_code": 422, "detail": e.errors(include_url=False, include_context=False)})
+        except Exception as e:
+            results.append({"index": index, "status_code": 400, "detail": str(e)})
+
+    compared = [result for result in results if result["status_code"] == 200]
+    comparison = {"labels": [result["label"] for result in compared]}
+    for metric in COMPARE_METRICS:
+        comparison[metric] = [result["analytics"]["per_week"][metric] for result in compared]
+    return {"results": results, "comparison": comparison}
+
+# 1RM formula registry
+class OneRMFormula:
+    """
+    A 1RM formula, as a pair of coefficient functions of reps.
+
+    estimate(reps) gives the multiplier from a set weight to its 1RM.
+    inverse(reps) gives (mul, div) so that weight = one_rm * mul / div.
+    Both accept plain ints or NumPy arrays of reps. max_reps, if set, is the
+    largest rep count the formula is defined for in bulk estimation.
+    """
+
+    def __init__(self, name: str,
+                 estimate: Callable[[Any], Any],
+                 inverse: Callable[[Any], tuple],
+                 max_reps: Optional[int] = None):
+        self.name = name
+        self.estimate = estimate
+        self.inverse = inverse
+        self.max_reps = max_reps
+
+        # Precomputed weight-for-reps coefficients over the RM table targets
+        mul, div = zip(*(inverse(reps) if reps != 1 else (1, 1) for reps in RM_TABLE_REP_TARGETS))
+        self.table_mul = np.array(mul, dtype=float)
+        self.table_div = np.array(div, dtype=float)
+
+    def one_rm(self, weight: float, reps: int) -> float:
+        if reps == 1:
+            return weight
+        return weight * self.estimate(reps)
+
+    def weight_for_reps(self, one_rm: float, reps: int) -> float:
+        if reps == 1:
+            return one_rm
+        mul, div = self.inverse(reps)
+        return one_rm * mul / div
+
+    def one_rm_array(self, weights: np.ndarray, reps: np.ndarray) -> np.ndarray:
+        return np.where(reps == 1, weights, weights * self.estimate(reps))
+
+    def table_weights(self, one_rms: np.ndarray) -> np.ndarray:
+        # one_rms x rep targets
+        return one_rms[..., np.newaxis] * self.table_mul / self.table_div
+
+RM_TABLE_REP_TARGETS = [1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 13, 16, 20]
+
+ONE_RM_FORMULAS: Dict[str, OneRMFormula] = {}
+
+def register_formula(formula: OneRMFormula):
+    ONE_RM_FORMULAS[formula.name] = formula
+
+register_formula(OneRMFormula(
+    "epley",
+    estimate=lambda reps: 1 + 0.033 * reps,
+    inverse=lambda reps: (1, 1 + 0.033 * reps),
+))
+register_formula(OneRMFormula(
+    "brzycki",
+    estimate=lambda reps: 36 / (37 - reps),
+    inverse=lambda reps: (37 - reps, 36),
+    max_reps=36,
+))
+register_formula(OneRMFormula(
+    "lombardi",
+    estimate=lambda reps: reps ** 0.1,
+    inverse=lambda reps: (1, reps ** 0.1),
+))
+
+def get_formula(formula: str) -> OneRMFormula:
+    try:
+        return ONE_RM_FORMULAS[formula.lower()]
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Invalid formula. Use 'epley', 'brzycki', or 'lombardi'")
+
 # Existing 1RM functions
 def calculate_1rm(weight: float, reps: int, formula: str) -> float:
     if reps == 1:
         return weight
-    
-    if formula.lower() == "epley":
-        return weight * (1 + 0.033 * reps)
-    elif formula.lower() == "brzycki":
-        return weight * (36 / (37 - reps))
-    elif formula.lower() == "lombardi":
-        return weight * (reps ** 0.1)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid formula. Use 'epley', 'brzycki', or 'lombardi'")
+    return get_formula(formula).one_rm(weight, reps)
 
 def calculate_weight_for_reps(one_rm: float, reps: int, formula: str) -> float:
     if reps == 1:
         return one_rm
-    if formula.lower() == "epley":
-        return one_rm / (1 + 0.033 * reps)
-    elif formula.lower() == "brzycki":
-        return one_rm * (37 - reps) / 36
-    elif formula.lower() == "lombardi":
-        return one_rm / (reps ** 0.1)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid formula. Use 'epley', 'brzycki', or 'lombardi'")
+    return get_formula(formula).weight_for_reps(one_rm, reps)
 
-def generate_rm_table(one_rm: float, input_reps: int, input_weight: float, formula: str) -> List[dict]:
-    rep_targets = [1,2,3,4,5,6,7,8,9,10,13,16,20]
+def _rm_table_rows(one_rm: float, input_reps: int, weights: List[float]) -> List[dict]:
     table = []
-    for reps in rep_targets:
-        if reps == input_reps:
-            is_input = True
-        else:
-            is_input = False
-        weight = round(calculate_weight_for_reps(one_rm, reps, formula), 2)
+    for reps, weight in zip(RM_TABLE_REP_TARGETS, weights):
+        weight = round(weight, 2)
         percent = round((weight / one_rm) * 100, 2)
         table.append({
             "reps": f"{reps}RM",
             "percentage": f"{percent}%",
             "weight": f"{weight:.2f}",
-            "is_input": is_input
+            "is_input": reps == input_reps
         })
     return table
 
+def generate_rm_table(one_rm: float, input_reps: int, input_weight: float, formula: str) -> List[dict]:
+    weights = get_formula(formula).table_weights(np.float64(one_rm)).tolist()
+    return _rm_table_rows(one_rm, input_reps, weights)
+
+def format_rm_table(table: List[dict]) -> str:
+    lines = ["Reps    Percent Weight\n", "------------------------\n"]
+    for row in table:
+        arrow = " <--" if row["is_input"] else ""
+        lines.append(f"{row['reps']:<7} {row['percentage']:<7} {row['weight']}{arrow}\n")
+    return "".join(lines)
+
+def calculate_1rm_bulk(items: List[OneRMRequest], include_tables: bool = False) -> List[Dict]:
+    """
+    Estimate 1RMs for many (weight, reps, formula) entries at once.
+
+    Entries are grouped by formula and computed as arrays. Returns one result
+    per entry, in order: {"one_rm": ...} (plus "table" when requested) or
+    {"error": ...} when the entry is outside the formula's domain.
+    """
+    results: List[Dict] = [{} for _ in items]
+    groups: Dict[str, List[int]] = {}
+    for i, item in enumerate(items):
+        formula = ONE_RM_FORMULAS.get(item.formula.lower())
+        if formula is None:
+            results[i]["error"] = f"Invalid formula '{item.formula}'. Use one of: {', '.join(ONE_RM_FORMULAS)}"
+        elif item.weight <= 0:
+            results[i]["error"] = "Weight must be greater than 0."
+        elif item.reps < 1:
+            results[i]["error"] = "Reps must be at least 1."
+        elif formula.max_reps is not None and item.reps > formula.max_reps:
+            results[i]["error"] = f"The {formula.name} formula is only defined up to {formula.max_reps} reps."
+        else:
+            groups.setdefault(formula.name, []).append(i)
+
+    for name, indices in groups.items():
+        formula = ONE_RM_FORMULAS[name]
+        weights = np.array([items[i].weight for i in indices], dtype=float)
+        reps = np.array([items[i].reps for i in indices])
+        one_rms = formula.one_rm_array(weights, reps)
+        tables = formula.table_weights(one_rms).tolist() if include_tables else None
+        for n, (i, one_rm) in enumerate(zip(indices, one_rms.tolist())):
+            results[i]["one_rm"] = round(one_rm, 2)
+            if include_tables:
+                results[i]["table"] = _rm_table_rows(one_rm, items[i].reps, tables[n])
+    return results
+
+# Response cache for the program generators
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.body: Optional[bytes] = None
+        self.error: Optional[BaseException] = None
+
+class ResponseCache:
+    """
+    Bounded LRU/TTL cache of serialized responses.
+
+    Concurrent requests for the same key share a single computation: the first
+    caller computes, the rest wait on it and receive the same bytes (or error).
+    Errors are never cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, _InFlight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, body = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return body
+                del self._entries[key]
+                self.expirations += 1
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _InFlight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.body
+
+        try:
+            flight.body = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and self.maxsize > 0:
+                    self._entries[key] = (time.monotonic() + self.ttl, flight.body)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+                del self._inflight[key]
+            flight.event.set()
+        return flight.body
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+response_cache = ResponseCache(
+    maxsize=int(os.environ.get("RESPONSE_CACHE_SIZE", 1024)),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", 300)),
+)
+
+
+def _canonical(route: str, params: dict) -> str:
+    return route + ":" + json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+def canonical_wendler531(request: Wendler531Request, analytics: bool = False) -> str:
+    # Only normalize what can't change the response: lift and template order
+    # are both reflected in the output, so they are kept as sent. Analytics
+    # derive 1RMs from tm_percentage even when the maxes are training maxes.
+    params = request.model_dump(mode="json")
+    lifts = params["active_lifts"] or Wendler531Generator.LIFTS
+    params["active_lifts"] = list(dict.fromkeys(lifts))
+    params["templates"] = params["templates"] or []
+    if Template.FSL.value not in params["templates"]:
+        params["fsl_params"] = None
+    if params["max_type"] == MaxType.TRAINING_MAX.value and not analytics:
+        params["tm_percentage"] = None
+    return _canonical("wendler531", params)
+
+def canonical_hlm_standard(request: HLMStandardRequest) -> str:
+    return _canonical("hlm/standard", request.model_dump(mode="json"))
+
+def canonical_hlm_alternate(request: HLMAlternateRequest) -> str:
+    return _canonical("hlm/alternate", request.model_dump(mode="json"))
+
+def template_label(templates: Optional[List[Template]]) -> str:
+    return "+".join(sorted({Template(t).value for t in templates})) if templates else "default"
+
+def cached_json_response(key: str, generate: Callable[[], Dict]) -> Response:
+    begin_handler()
+
+    def compute() -> bytes:
+        try:
+            with timed_stage("generation"):
+                output = generate()
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        with timed_stage("serialization"):
+            return render_json(output)
+    return Response(content=response_cache.get_or_compute(key, compute), media_type="application/json")
+
+# HTTP caching for the GET variants. Responses are fully determined by the
+# canonical input, the generator code and the program definitions, so all of
+# them go into the ETag.
+def generator_version() -> str:
+    digest = hashlib.sha256()
+    with open(__file__, "rb") as f:
+        digest.update(f.read())
+    for name, plan in sorted(PROGRAM_PLANS.items()):
+        digest.update(json.dumps([name, plan.definition], sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+GENERATOR_VERSION = os.environ.get("GENERATOR_VERSION") or generator_version()
+HTTP_CACHE_CONTROL = os.environ.get("HTTP_CACHE_CONTROL", "public, max-age=3600")
+
+def response_etag(key: str) -> str:
+    return '"' + hashlib.sha256(f"{GENERATOR_VERSION}:{key}".encode()).hexdigest()[:32] + '"'
+
+def _etag_opaque(tag: str) -> str:
+    # Weak comparison, and the gzip variant counts as the same entity
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    return tag[:-len('-gzip"')] + '"' if tag.endswith('-gzip"') else tag
+
+def _matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    # The variant of etag the client validated with, or None if none matched
+    if not if_none_match:
+        return None
+    for tag in (tag.strip() for tag in if_none_match.split(",")):
+        if tag == "*":
+            return etag
+        if _etag_opaque(tag) == etag:
+            return tag
+    return None
+
+def _will_gzip(request: Request, size: int) -> bool:
+    # Mirrors GZipMiddleware's decision, so the compressed body gets its own tag
+    return bool(GZIP_MINIMUM_SIZE) and size >= GZIP_MINIMUM_SIZE and "gzip" in request.headers.get("accept-encoding", "")
+
+def conditional_json_response(request: Request, key: str, generate: Callable[[], Dict]) -> Response:
+    """
+    cached_json_response with an ETag and Cache-Control, answering a matching
+    If-None-Match with 304 before anything is generated.
+    """
+    etag = response_etag(key)
+    headers = {"Cache-Control": HTTP_CACHE_CONTROL}
+    matched = _matching_etag(request.headers.get("if-none-match"), etag)
+    if matched is not None:
+        begin_handler()
+        return Response(status_code=304, headers={**headers, "ETag": matched})
+
+    response = cached_json_response(key, generate)
+    if _will_gzip(request, len(response.body)):
+        etag = etag[:-1] + '-gzip"'
+    response.headers.update({**headers, "ETag": etag})
+    return response
+
+# Program types by name, for endpoints that take a mix of programs
+PROGRAM_TYPES = {
+    "wendler531": (Wendler531Request, Wendler531Generator),
+    "hlm_standard": (HLMStandardRequest, HLMStandardGenerator),
+    "hlm_alternate": (HLMAlternateRequest, HLMAlternatePressingGenerator),
+}
+
+def program_factory(item: Dict[str, Any]) -> Callable[[], Any]:
+    """Validate a {"program": ..., "params": ...} entry; the returned callable builds its generator."""
+    spec = PROGRAM_TYPES.get(item.get("program"))
+    if spec is None:
+        raise ValueError(f"Unknown program {item.get('program')!r}. Use one of: {', '.join(PROGRAM_TYPES)}")
+    model, generator_class = spec
+    return partial(generator_class, **model.model_validate(item.get("params") or {}).model_dump())
+
+def build_generator(item: Dict[str, Any]):
+    """Validate a {"program": ..., "params": ...} entry and build its generator."""
+    return program_factory(item)()
+
+# Bulk generation jobs
+def _generate_job_item(item: Dict[str, Any]) -> Dict:
+    try:
+        return {"status_code": 200, "program": build_generator(item).generate()}
+    except ValidationError as e:
+        return {"status_code": 422, "detail": e.errors(include_url=False, include_context=False)}
+    except Exception as e:
+        return {"status_code": 400, "detail": str(e)}
+
+def _run_job_chunk(items: List[Dict[str, Any]]) -> List[tuple]:
+    # Runs in a worker process, which also does the encoding: (status code, JSON bytes)
+    results = [_generate_job_item(item) for item in items]
+    return [(result["status_code"], render_json(result)) for result in results]
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    CANCELLED = "cancelled"
+    FAILED = "failed"
+
+class Job:
+    def __init__(self, items: List[Dict[str, Any]], chunk_size: int):
+        self.id = uuid.uuid4().hex
+        self.items = items
+        self.chunk_size = chunk_size
+        # Each finished result as JSON bytes, index first
+        self.results: List[Optional[bytes]] = [None] * len(items)
+        self.result_bytes = 0
+        self.status = JobStatus.QUEUED
+        self.error: Optional[str] = None
+        self.completed = 0
+        self.failed = 0
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancelled = threading.Event()
+        self.futures: List[Future] = []
+        self.lock = threading.Lock()
+
+    def progress(self) -> Dict:
+        with self.lock:
+            return {
+                "job_id": self.id,
+                "status": self.status.value,
+                "total": len(self.items),
+                "completed": self.completed,
+                "failed": self.failed,
+                "progress": round(self.completed / len(self.items) * 100, 2) if self.items else 100.0,
+                "created_at": self.created_at,
+                "finished_at": self.finished_at,
+                "error": self.error,
+            }
+
+class JobManager:
+    """
+    Runs bulk generation jobs on a process pool.
+
+    Each job is split into chunks that are handed to the pool, with at most
+    `concurrency` chunks of one job in the pool at a time, and at most
+    `max_running` jobs running at once; further jobs wait their turn. Finished
+    jobs are kept until more than `history` of them have accumulated, or
+    their results add up to more than `max_result_bytes`; the oldest go first.
+    """
+
+    def __init__(self, workers: int, concurrency: int, max_running: int, history: int, start_method: str,
+                 max_result_bytes: int):
+        self.workers = workers
+        self.start_method = start_method
+        self.concurrency = concurrency
+        self.history = history
+        self.max_result_bytes = max_result_bytes
+        self._running = threading.BoundedSemaphore(max_running)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Created on first use so importing the app doesn't start processes
+        with self._lock:
+            if self._executor is None:
+                # Not forked: the app process has the event loop and threadpool running
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(self.start_method)
+                )
+            return self._executor
+
+    def submit(self, items: List[Dict[str, Any]], chunk_size: int) -> Job:
+        job = Job(items, chunk_size)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        threading.Thread(target=self._run, args=(job,), name=f"job-{job.id}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancelled.set()
+        for future in list(job.futures):
+            future.cancel()
+        return job
+
+    def shutdown(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            executor, self._executor = self._executor, None
+        for job in jobs:
+            job.cancelled.set()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished_at is not None]
+        total = sum(job.result_bytes for job in finished)
+        for i, job in enumerate(finished):
+            if len(finished) - i <= self.history and total <= self.max_result_bytes:
+                break
+            total -= job.result_bytes
+            del self._jobs[job.id]
+
+    def _run(self, job: Job):
+        with self._running:
+            if job.cancelled.is_set():
+                self._finish(job, JobStatus.CANCELLED)
+                return
+            with job.lock:
+                job.status = JobStatus.RUNNING
+
+            in_flight = threading.BoundedSemaphore(self.concurrency)
+            try:
+                executor = self._get_executor()
+                for start in range(0, len(job.items), job.chunk_size):
+                    in_flight.acquire()
+                    # Set by cancel() and by _fail(), e.g. when the pool broke
+                    if job.cancelled.is_set():
+                        in_flight.release()
+                        break
+                    try:
+                        future = executor.submit(_run_job_chunk, job.items[start:start + job.chunk_size])
+                    except BaseException:
+                        in_flight.release()
+                        raise
+                    job.futures.append(future)
+                    future.add_done_callback(
+                        lambda f, start=start: (self._collect(job, start, f), in_flight.release())
+                    )
+            except Exception as e:
+                self._fail(job, e)
+            finally:
+                # Every chunk releases its slot once collected (or cancelled),
+                # so holding all slots means the job has drained
+                for _ in range(self.concurrency):
+                    in_flight.acquire()
+
+            self._finish(job, JobStatus.CANCELLED if job.cancelled.is_set() else JobStatus.COMPLETED)
+
+    def _collect(self, job: Job, start: int, future: Future):
+        if future.cancelled():
+            return
+        try:
+            results = future.result()
+        except Exception as e:
+            self._fail(job, e)
+            return
+        with job.lock:
+            for offset, (status_code, body) in enumerate(results):
+                body = b'{"index":%d,' % (start + offset) + body[1:]
+                job.results[start + offset] = body
+                job.result_bytes += len(body)
+                job.completed += 1
+                if status_code != 200:
+                    job.failed += 1
+        programs = [job.items[start + offset]["program"] for offset, (status_code, _) in enumerate(results) if status_code == 200]
+        for program, group in groupby(sorted(programs)):
+            count_generation(program, "job", len(list(group)))
+
+    def _fail(self, job: Job, error: Exception):
+        with job.lock:
+            job.error = str(error) or type(error).__name__
+        self.cancel(job.id)
+        if isinstance(error, BrokenProcessPool):
+            # A worker died; start a fresh pool for the next job
+            with self._lock:
+                self._executor = None
+
+    def _finish(self, job: Job, status: JobStatus):
+        with job.lock:
+            job.status = JobStatus.FAILED if job.error is not None else status
+            job.finished_at = time.time()
+            # Inputs are no longer needed once the job is done
+            job.items = [None] * len(job.items)
+        with self._lock:
+            self._prune()
+
+JOB_MAX_ITEMS = int(os.environ.get("JOB_MAX_ITEMS", 100000))
+
+# Leave a core for the event loop and interactive requests
+JOB_DEFAULT_WORKERS = max((os.cpu_count() or 1) - 1, 1)
+
+job_manager = JobManager(
+    workers=int(os.environ.get("JOB_WORKERS", JOB_DEFAULT_WORKERS)),
+    concurrency=int(os.environ.get("JOB_CONCURRENCY", JOB_DEFAULT_WORKERS)),
+    max_running=int(os.environ.get("JOB_MAX_RUNNING", 2)),
+    history=int(os.environ.get("JOB_HISTORY", 100)),
+    max_result_bytes=int(os.environ.get("JOB_MAX_RESULT_BYTES", 512 * 1024 * 1024)),
+    start_method=os.environ.get(
+        "JOB_START_METHOD", "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    ),
+)
+
+# Exports
+EXPORT_COLUMNS = ["athlete", "title", "program", "section", "exercise", "set", "reps", "weight", "percentage", "notes"]
+
+def _program_title(output: Dict) -> str:
+    return output.get("header_text") or output.get("template_name") or "Wendler 5/3/1"
+
+def _program_rows(program: str, generator, output: Dict) -> Iterator[list]:
+    # section, exercise, set, reps, weight, percentage, notes
+    if program == "wendler531":
+        widowmaker = generator.PLAN.supplemental_for([Template.WIDOWMAKER.value])
+        for week in output["program"]:
+            for lift in week["lifts"]:
+                for s in lift["sets"]:
+                    yield [week["name"], lift["name"], s["set_number"], s["reps"], s["weight"], s["percentage"], ""]
+                if "fsl" in lift:
+                    fsl = lift["fsl"]
+                    yield [week["name"], lift["name"], "FSL", f"{fsl['sets']}x{fsl['reps']}", fsl["weight"], "", ""]
+                if "widowmaker" in lift:
+                    yield [week["name"], lift["name"], "Widowmaker", widowmaker.reps, lift["widowmaker"]["weight"], "", ""]
+                for row in lift.get("pyramid", []):
+                    yield [week["name"], lift["name"], "Pyramid", row["reps"], row["weight"], "", ""]
+    else:
+        # One row per set, from the generator's entries rather than the rendered strings
+        for day, entries in generator.entries.items():
+            for entry in entries:
+                sets, _, reps = entry.scheme.partition("x")
+                notes = f"{entry.intensity}, {entry.note}" if entry.note else entry.intensity
+                for set_number in range(1, int(sets) + 1):
+                    yield [day, entry.exercise, set_number, reps, entry.weight, "", notes]
+
+def _generate_export(factory: Callable[[], Any]) -> tuple:
+    # Generators are only built as the stream reaches them (HLM ones do their
+    # work in __init__): (generator, output), or (None, error message)
+    try:
+        generator = factory()
+        return generator, generator.generate()
+    except Exception as e:
+        return None, str(e)
+
+def export_csv(programs: List[tuple]) -> Iterator[str]:
+    """Yield a CSV export of (program, generator factory) pairs, one line at a time."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def line(row: list) -> str:
+        writer.writerow(row)
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return value
+
+    yield line(EXPORT_COLUMNS)
+    for athlete, (program, factory) in enumerate(programs, start=1):
+        generator, output = _generate_export(factory)
+        if generator is None:
+            yield line([athlete, "", program, "", "", "", "", "", "", f"Error: {output}"])
+            continue
+        title = _program_title(output)
+        for row in _program_rows(program, generator, output):
+            yield line([athlete, title, program] + row)
+
+EXPORT_HTML_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Training programs</title>
+<style>
+body { font-family: sans-serif; font-size: 11pt; margin: 1.5cm; }
+h1 { font-size: 16pt; margin-bottom: 0.2cm; }
+h2 { font-size: 12pt; margin: 0.4cm 0 0.1cm; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 0.3cm; }
+th, td { border: 1px solid #999; padding: 2px 6px; text-align: left; }
+th { background: #eee; }
+section { page-break-after: always; }
+section:last-child { page-break-after: auto; }
+@media print { body { margin: 0; } }
+</style>
+</head>
+<body>
+"""
+
+def export_html(programs: List[tuple]) -> Iterator[str]:
+    """Yield a printable HTML sheet of (program, generator factory) pairs, one athlete per page."""
+    yield EXPORT_HTML_HEAD
+    for program, factory in programs:
+        generator, output = _generate_export(factory)
+        if generator is None:
+            yield f"<section>\n<h1>{html.escape(program)}</h1>\n<p>Error: {html.escape(output)}</p>\n</section>\n"
+            continue
+        yield f"<section>\n<h1>{html.escape(_program_title(output))}</h1>\n"
+
+        section = None
+        for row in _program_rows(program, generator, output):
+            if row[0] != section:
+                if section is not None:
+                    yield "</table>\n"
+                section = row[0]
+                yield f"<h2>{html.escape(str(section))}</h2>\n"
+                if program == "wendler531":
+                    yield "<table>\n<tr><th>Lift</th><th>Set</th><th>Reps</th><th>Weight</th><th>%</th></tr>\n"
+                else:
+                    yield "<table>\n<tr><th>Exercise</th><th>Set</th><th>Reps</th><th>Weight</th><th>Notes</th></tr>\n"
+            cells = row[1:6] if program == "wendler531" else row[1:5] + row[6:]
+            yield "<tr>" + "".join(f"<td>{html.escape(str(cell))}</td>" for cell in cells) + "</tr>\n"
+        if section is not None:
+            yield "</table>\n"
+        yield "</section>\n"
+    yield "</body>\n</html>\n"
+
+EXPORT_FORMATS = {
+    "csv": (export_csv, "text/csv; charset=utf-8", "attachment; filename=programs.csv"),
+    "html": (export_html, "text/html; charset=utf-8", "inline; filename=programs.html"),
+}
+
+# Training log ingestion
+LIFT_ALIASES = {
+    "squat": "squat", "back squat": "squat",
+    "bench": "bench", "bench press": "bench",
+    "deadlift": "deadlift", "pull": "deadlift",
+    "press": "press", "ohp": "press", "overhead press": "press",
+}
+
+@dataclass(slots=True)
+class LiftHistory:
+    """e1RM history of one athlete's lift: all-time best plus the sessions inside the rolling window."""
+    best_e1rm: float = 0.0
+    best_date: Optional[int] = None
+    last_date: Optional[int] = None
+    # (date ordinal, best e1RM that session), oldest first
+    sessions: deque = field(default_factory=deque)
+
+    def add_session(self, date: int, e1rm: float, window_days: int):
+        if e1rm > self.best_e1rm:
+            self.best_e1rm = e1rm
+            self.best_date = date
+        # Logs need not be in date order across chunks (or at all); keep sessions sorted
+        self.last_date = date if self.last_date is None else max(self.last_date, date)
+        if date <= self.last_date - window_days:
+            return
+        if self.sessions and self.sessions[-1][0] < date:
+            self.sessions.append((date, e1rm))
+        else:
+            i = bisect.bisect_left(self.sessions, (date,))
+            if i < len(self.sessions) and self.sessions[i][0] == date:
+                self.sessions[i] = (date, max(self.sessions[i][1], e1rm))
+            else:
+                self.sessions.insert(i, (date, e1rm))
+        while self.sessions[0][0] <= self.last_date - window_days:
+            self.sessions.popleft()
+
+    def summary(self) -> Dict:
+        dates = np.array([d for d, _ in self.sessions], dtype=float)
+        e1rms = np.array([e for _, e in self.sessions])
+        trend = None
+        if len(dates) > 1 and dates[-1] > dates[0]:
+            # Least-squares slope, in kg per week
+            trend = round(float(np.polyfit(dates, e1rms, 1)[0]) * 7, 2)
+        return {
+            "best_e1rm": round(self.best_e1rm, 2),
+            "best_date": date_from_ordinal(self.best_date),
+            "rolling_best_e1rm": round(float(e1rms.max()), 2),
+            "trend_per_week": trend,
+            "last_date": date_from_ordinal(self.last_date),
+            "sessions_in_window": len(self.sessions),
+        }
+
+def date_from_ordinal(ordinal: Optional[int]) -> Optional[str]:
+    return datetime.date.fromordinal(ordinal).isoformat() if ordinal is not None else None
+
+class LogIngestion:
+    """
+    State of one log upload: parses records as they arrive and hands them to
+    the tracker in chunks.
+
+    Sessions are identified by date. Rows dated on or before the last session
+    already ingested for that athlete's lift (as of the start of this upload)
+    are skipped before any e1RM is computed, so re-sending a log with new
+    sessions appended only processes the new rows.
+    """
+
+    COLUMNS = ("athlete", "lift", "date", "weight", "reps")
+    MAX_ERRORS = 20
+
+    def __init__(self, tracker: "TrainingLogTracker", log_format: str, formula: OneRMFormula, chunk_rows: int = 10000):
+        self.tracker = tracker
+        self.log_format = log_format
+        self.formula = formula
+        self.chunk_rows = chunk_rows
+        self.header: Optional[List[str]] = None
+        self.pending = b""
+        self.line_number = 0
+        self.rows = {column: [] for column in self.COLUMNS}
+        self.watermarks: Dict[tuple, Optional[int]] = {}
+        self.touched: set = set()
+        self.counts = {"rows": 0, "ingested": 0, "skipped": 0, "rejected": 0}
+        self.out_of_domain = 0
+        self.errors: List[Dict] = []
+
+    def feed(self, data: bytes):
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        for line in lines:
+            self._parse_line(line)
+
+    def finish(self) -> Dict:
+        if self.pending:
+            self._parse_line(self.pending)
+            self.pending = b""
+        self._flush()
+        if self.out_of_domain:
+            self.errors.append({
+                "line": None,
+                "error": f"{self.out_of_domain} sets had non-positive weight or reps outside the {self.formula.name} formula's range"
+            })
+        return {
+            **self.counts,
+            "errors": self.errors,
+            "athletes": self.tracker.summaries(self.touched),
+        }
+
+    def _reject(self, message: str):
+        self.counts["rejected"] += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append({"line": self.line_number, "error": message})
+
+    def _parse_line(self, line: bytes):
+        self.line_number += 1
+        line = line.strip()
+        if not line:
+            return
+        if self.log_format == "csv" and self.header is None:
+            self.header = [v.strip().lower() for v in next(csv.reader([line.decode("utf-8", "replace")]))]
+            missing = [c for c in self.COLUMNS if c not in self.header]
+            if missing:
+                raise HTTPException(status_code=400, detail=f"CSV header is missing columns: {missing}")
+            return
+
+        try:
+            if self.log_format == "csv":
+                record = dict(zip(self.header, next(csv.reader([line.decode("utf-8")]))))
+            else:
+                record = json.loads(line)
+
+            self.counts["rows"] += 1
+            athlete = str(record["athlete"]).strip()
+            lift = LIFT_ALIASES.get(str(record["lift"]).strip().lower())
+            if lift is None:
+                raise ValueError(f"Unknown lift {record['lift']!r}")
+            date = datetime.date.fromisoformat(str(record["date"]).strip()).toordinal()
+            weight = float(record["weight"])
+            reps = int(record["reps"])
+        except ValueError as e:
+            self._reject(str(e))
+            return
+        except (KeyError, TypeError) as e:
+            self._reject(f"Missing or invalid field {e}")
+            return
+
+        self.rows["athlete"].append(athlete)
+        self.rows["lift"].append(lift)
+        self.rows["date"].append(date)
+        self.rows["weight"].append(weight)
+        self.rows["reps"].append(reps)
+        if len(self.rows["date"]) >= self.chunk_rows:
+            self._flush()
+
+    def _flush(self):
+        rows, self.rows = self.rows, {column: [] for column in self.COLUMNS}
+        if not rows["date"]:
+            return
+
+        keys = list(zip(rows["athlete"], rows["lift"]))
+        for key in set(keys) - self.watermarks.keys():
+            self.watermarks[key] = self.tracker.last_date(key)
+        watermarks = np.array([self.watermarks[key] if self.watermarks[key] is not None else -1 for key in keys])
+
+        dates = np.array(rows["date"])
+        weights = np.array(rows["weight"], dtype=float)
+        reps = np.array(rows["reps"])
+        new = dates > watermarks
+        valid = (weights > 0) & (reps >= 1)
+        if self.formula.max_reps is not None:
+            valid &= reps <= self.formula.max_reps
+
+        self.counts["skipped"] += int((~new).sum())
+        out_of_domain = int((new & ~valid).sum())
+        self.counts["rejected"] += out_of_domain
+        self.out_of_domain += out_of_domain
+        keep = new & valid
+        if not keep.any():
+            return
+
+        e1rms = self.formula.one_rm_array(weights[keep], reps[keep])
+        kept_keys = [key for key, k in zip(keys, keep.tolist()) if k]
+        self.counts["ingested"] += len(kept_keys)
+        self.touched.update(kept_keys)
+        self.tracker.add_sets(kept_keys, dates[keep], e1rms)
+
+class TrainingLogTracker:
+    """Per-athlete, per-lift e1RM history built from ingested training logs."""
+
+    def __init__(self, window_days: int = 90):
+        self.window_days = window_days
+        self._lifts: Dict[tuple, LiftHistory] = {}
+        self._lock = threading.Lock()
+
+    def last_date(self, key: tuple) -> Optional[int]:
+        with self._lock:
+            history = self._lifts.get(key)
+            return history.last_date if history is not None else None
+
+    def add_sets(self, keys: List[tuple], dates: np.ndarray, e1rms: np.ndarray):
+        # Reduce to one best e1RM per (athlete, lift, session) before touching state
+        key_index = {key: i for i, key in enumerate(dict.fromkeys(keys))}
+        codes = np.array([key_index[key] for key in keys])
+        order = np.lexsort((dates, codes))
+        codes, dates, e1rms = codes[order], dates[order], e1rms[order]
+        starts = np.flatnonzero(np.r_[True, (codes[1:] != codes[:-1]) | (dates[1:] != dates[:-1])])
+        session_bests = np.maximum.reduceat(e1rms, starts)
+
+        unique_keys = list(key_index)
+        with self._lock:
+            for code, date, e1rm in zip(codes[starts].tolist(), dates[starts].tolist(), session_bests.tolist()):
+                key = unique_keys[code]
+                history = self._lifts.get(key)
+                if history is None:
+                    history = self._lifts[key] = LiftHistory()
+                history.add_session(date, e1rm, self.window_days)
+
+    def summaries(self, keys) -> Dict[str, Dict[str, Dict]]:
+        output: Dict[str, Dict[str, Dict]] = {}
+        with self._lock:
+            for athlete, lift in sorted(keys):
+                output.setdefault(athlete, {})[lift] = self._lifts[(athlete, lift)].summary()
+        return output
+
+    def athlete_maxes(self, athlete: str) -> Dict[str, float]:
+        # Rolling-best e1RM per lift, the value fed to the program generators
+        with self._lock:
+            return {
+                lift: round(max(e for _, e in history.sessions), 2)
+                for (name, lift), history in self._lifts.items()
+                if name == athlete and history.sessions
+            }
+
+    def athlete_summary(self, athlete: str) -> Dict[str, Dict]:
+        with self._lock:
+            keys = [key for key in self._lifts if key[0] == athlete]
+        return self.summaries(keys).get(athlete, {})
+
+training_logs = TrainingLogTracker(window_days=int(os.environ.get("E1RM_WINDOW_DAYS", 90)))
+
+# Athlete profiles, stored in SQLite
+PROFILE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    athlete TEXT NOT NULL,
+    program TEXT NOT NULL,
+    params TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (athlete, program)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS program_parts (
+    athlete TEXT NOT NULL,
+    program TEXT NOT NULL,
+    part TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (athlete, program, part)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rendered_programs (
+    athlete TEXT NOT NULL,
+    program TEXT NOT NULL,
+    format TEXT NOT NULL,
+    body BLOB NOT NULL,
+    PRIMARY KEY (athlete, program, format)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+class ProgramParts:
+    """
+    How a stored program is split into separately regenerated parts.
+
+    The default is a single part holding the whole program in both formats,
+    regenerated whenever any parameter changes.
+    """
+
+    def fingerprints(self, params: Dict[str, Any]) -> Dict[str, str]:
+        return {"program": _canonical("program", params)}
+
+    def build(self, generator, part: str) -> Any:
+        return {OutputFormat.NESTED.value: generator.generate(), OutputFormat.COLUMNAR.value: generator.generate_columnar()}
+
+    def assemble(self, generator, parts: Dict[str, Any], format: OutputFormat) -> Dict:
+        return parts["program"][format.value]
+
+class Wendler531Parts(ProgramParts):
+    """One part per active lift, holding that lift's weights (and plates) for every week."""
+
+    # Everything a lift's rows depend on apart from its own max
+    SHARED_INPUTS = ("max_type", "tm_percentage", "templates", "fsl_params", "plates")
+
+    def fingerprints(self, params: Dict[str, Any]) -> Dict[str, str]:
+        shared = {key: params.get(key) for key in self.SHARED_INPUTS}
+        lifts = dict.fromkeys(params.get("active_lifts") or Wendler531Generator.LIFTS)
+        return {lift: _canonical(lift, dict(shared, max=params[lift])) for lift in lifts}
+
+    def build(self, generator, part: str) -> Any:
+        program = generator.build_program({part: generator.maxes[part]})
+        return {
+            "weights": [week[0] for week in program.weights],
+            "plates": [week[0] for week in program.plates] if program.plates else None,
+        }
+
+    def assemble(self, generator, parts: Dict[str, Any], format: OutputFormat) -> Dict:
+        lifts = list(generator.maxes)
+        weeks = range(len(Wendler531Generator.STRUCTURE_CORE))
+        program = Wendler531Program(
+            header_text=generator.header_text,
+            training_maxes=generator.maxes,
+            templates=generator.templates,
+            fsl_params=getattr(generator, "fsl_params", None),
+            weights=[[parts[lift]["weights"][w] for lift in lifts] for w in weeks],
+            plates=[[parts[lift]["plates"][w] for lift in lifts] for w in weeks] if generator.plates else None
+        )
+        return program.to_columnar() if format == OutputFormat.COLUMNAR else program.to_dict()
+
+PROGRAM_PARTS = {"wendler531": Wendler531Parts()}
+
+class ProfileNotFound(LookupError):
+    pass
+
+class ProfileStore:
+    """
+    Program parameters saved per athlete, with their generated programs.
+
+    Each stored program is kept in parts with a fingerprint of the inputs it
+    was generated from (see ProgramParts). Saving a profile regenerates only
+    the parts whose fingerprint changed and stores the assembled nested
+    program, so reading it back is a single primary-key lookup. Columnar
+    output is assembled from the parts on first read and stored the same way.
+
+    Fingerprints include the generator version, and stored programs are
+    dropped when a different version opens the database, so a deploy that
+    changes generation doesn't keep serving programs from the old code.
+
+    Connections are pooled per process; a forked worker opens its own.
+    """
+
+    def __init__(self, path: str, version: str, pool_size: int = 4):
+        self.path = path
+        self.version = version
+        self.pool_size = pool_size
+        self._pool: deque = deque()
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(PROFILE_SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT value FROM store_meta WHERE key = 'generator_version'").fetchone()
+        if row is None or row[0] != self.version:
+            # Parts are rebuilt as they are read, their fingerprints no longer match
+            conn.execute("DELETE FROM rendered_programs")
+            conn.execute("INSERT OR REPLACE INTO store_meta VALUES ('generator_version', ?)", (self.version,))
+        conn.execute("COMMIT")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            if self._pid != os.getpid():
+                # Connections must not cross a fork; start this process's own pool
+                self._pool = deque()
+                self._pid = os.getpid()
+            conn = self._pool.popleft() if self._pool else None
+        if conn is None:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                if len(self._pool) < self.pool_size and self._pid == os.getpid():
+                    self._pool.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so concurrent saves of one
+        # profile can't both read the old parts and interleave their writes
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def profiles(self, athlete: str) -> Dict[str, Dict]:
+        with self.connection() as conn:
+            rows = conn.execute("SELECT program, params FROM profiles WHERE athlete = ?", (athlete,)).fetchall()
+        return {program: json.loads(params) for program, params in rows}
+
+    def save(self, athlete: str, program: str, params: Dict[str, Any], merge: bool = False) -> Dict:
+        """
+        Store a profile and bring its program up to date.
+
+        With merge, params are applied on top of the stored profile, which must
+        exist (ProfileNotFound otherwise). Raises ValueError for an unknown
+        program, ValidationError for malformed parameters and whatever the
+        generator raises for parameters it rejects. Returns the stored params
+        and the parts that were regenerated.
+        """
+        if program not in PROGRAM_TYPES:
+            raise ValueError(f"Unknown program {program!r}. Use one of: {', '.join(PROGRAM_TYPES)}")
+        model, _ = PROGRAM_TYPES[program]
+        splitter = PROGRAM_PARTS.get(program, ProgramParts())
+
+        with self.transaction() as conn:
+            if merge:
+                row = conn.execute(
+                    "SELECT params FROM profiles WHERE athlete = ? AND program = ?", (athlete, program)
+                ).fetchone()
+                if row is None:
+                    raise ProfileNotFound(f"No {program} profile for {athlete}.")
+                params = {**json.loads(row[0]), **params}
+
+            params = model.model_validate(params).model_dump(mode="json")
+            generator = build_generator({"program": program, "params": params})
+            parts, regenerated = self._update_parts(conn, athlete, program, params, generator)
+
+            conn.execute(
+                "INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?)",
+                (athlete, program, render_json(params).decode(), time.time())
+            )
+            conn.execute("DELETE FROM rendered_programs WHERE athlete = ? AND program = ?", (athlete, program))
+            conn.execute(
+                "INSERT INTO rendered_programs VALUES (?, ?, ?, ?)",
+                (athlete, program, OutputFormat.NESTED.value,
+                 render_json(splitter.assemble(generator, parts, OutputFormat.NESTED)))
+            )
+        return {"athlete": athlete, "program": program, "params": params, "regenerated": regenerated}
+
+    def _update_parts(self, conn: sqlite3.Connection, athlete: str, program: str, params: Dict[str, Any], generator) -> tuple:
+        """Regenerate the stored parts whose fingerprint changed: (parts, names of regenerated parts)."""
+        splitter = PROGRAM_PARTS.get(program, ProgramParts())
+        stored = {
+            part: (fingerprint, data)
+            for part, fingerprint, data in conn.execute(
+                "SELECT part, fingerprint, data FROM program_parts WHERE athlete = ? AND program = ?",
+                (athlete, program)
+            )
+        }
+        parts = {}
+        regenerated = []
+        for part, fingerprint in splitter.fingerprints(params).items():
+            fingerprint = f"{self.version}:{fingerprint}"
+            if part in stored and stored[part][0] == fingerprint:
+                parts[part] = json.loads(stored[part][1])
+                continue
+            parts[part] = splitter.build(generator, part)
+            regenerated.append(part)
+            conn.execute(
+                "INSERT OR REPLACE INTO program_parts VALUES (?, ?, ?, ?, ?)",
+                (athlete, program, part, fingerprint, render_json(parts[part]).decode())
+            )
+        for part in stored.keys() - parts.keys():
+            conn.execute(
+                "DELETE FROM program_parts WHERE athlete = ? AND program = ? AND part = ?", (athlete, program, part)
+            )
+        return parts, regenerated
+
+    def rendered(self, athlete: str, program: str, format: OutputFormat = OutputFormat.NESTED) -> Optional[bytes]:
+        """The stored program as JSON bytes, or None if the athlete has no such profile."""
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT body FROM rendered_programs WHERE athlete = ? AND program = ? AND format = ?",
+                (athlete, program, format.value)
+            ).fetchone()
+        if row is not None:
+            return row[0]
+
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT params FROM profiles WHERE athlete = ? AND program = ?", (athlete, program)
+            ).fetchone()
+            if row is None:
+                return None
+            params = json.loads(row[0])
+            generator = build_generator({"program": program, "params": params})
+            parts, _ = self._update_parts(conn, athlete, program, params, generator)
+            body = render_json(PROGRAM_PARTS.get(program, ProgramParts()).assemble(generator, parts, format))
+            conn.execute(
+                "INSERT OR REPLACE INTO rendered_programs VALUES (?, ?, ?, ?)", (athlete, program, format.value, body)
+            )
+        return body
+
+    def delete(self, athlete: str, program: str) -> bool:
+        with self.transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM profiles WHERE athlete = ? AND program = ?", (athlete, program)
+            ).rowcount
+            conn.execute("DELETE FROM program_parts WHERE athlete = ? AND program = ?", (athlete, program))
+            conn.execute("DELETE FROM rendered_programs WHERE athlete = ? AND program = ?", (athlete, program))
+        return bool(deleted)
+
+profile_store = ProfileStore(
+    os.environ.get("PROFILE_DB", "profiles.db"),
+    version=GENERATOR_VERSION,
+    pool_size=int(os.environ.get("PROFILE_DB_POOL", 4))
+)
+
+# What-if sweeps
+SWEEP_MAX_COMBINATIONS = int(os.environ.get("SWEEP_MAX_COMBINATIONS", 250000))
+
+def sweep_values(name: str, spec: SweepValues) -> np.ndarray:
+    """Expand a single value, list or range into a 1-D array of values."""
+    if isinstance(spec, SweepRange):
+        if spec.step <= 0:
+            raise ValueError(f"{name}: step must be positive.")
+        if spec.stop < spec.start:
+            raise ValueError(f"{name}: stop must not be below start.")
+        count = int(np.floor((spec.stop - spec.start) / spec.step + 1e-9)) + 1
+        if count > SWEEP_MAX_COMBINATIONS:
+            raise ValueError(f"{name}: range has more than {SWEEP_MAX_COMBINATIONS} values.")
+        # Rounded so steps like 0.05 don't come out as 0.15000000000000002
+        values = np.round(spec.start + spec.step * np.arange(count), 10)
+    else:
+        values = np.atleast_1d(np.asarray(spec, dtype=float))
+    if values.size == 0:
+        raise ValueError(f"{name} needs at least one value.")
+    return values
+
+def check_sweep_size(combinations: int):
+    if combinations > SWEEP_MAX_COMBINATIONS:
+        raise ValueError(f"Sweep has {combinations} combinations; the limit is {SWEEP_MAX_COMBINATIONS}.")
+
+# Live recalculation over WebSocket
+LIVE_MAX_MESSAGE_BYTES = int(os.environ.get("LIVE_MAX_MESSAGE_BYTES", 64 * 1024))
+
+def _pointer(path: tuple) -> str:
+    # RFC 6901 JSON Pointer
+    return "".join("/" + str(part).replace("~", "~0").replace("/", "~1") for part in path)
+
+def json_diff(old: Any, new: Any, path: tuple = ()) -> List[Dict]:
+    """
+    RFC 6902 JSON Patch operations turning `old` into `new`.
+
+    Dicts are compared key by key and equal-length lists element by element,
+    so only the values that changed are sent. Anything else that differs is
+    replaced whole.
+    """
+    if type(old) is not type(new):
+        return [{"op": "replace", "path": _pointer(path), "value": new}]
+    if isinstance(old, dict):
+        ops = []
+        for key, value in new.items():
+            if key in old:
+                ops.extend(json_diff(old[key], value, path + (key,)))
+            else:
+                ops.append({"op": "add", "path": _pointer(path + (key,)), "value": value})
+        ops.extend({"op": "remove", "path": _pointer(path + (key,))} for key in old if key not in new)
+        return ops
+    if isinstance(old, list) and len(old) == len(new):
+        ops = []
+        for i, (old_item, new_item) in enumerate(zip(old, new)):
+            ops.extend(json_diff(old_item, new_item, path + (i,)))
+        return ops
+    if old == new:
+        return []
+    return [{"op": "replace", "path": _pointer(path), "value": new}]
+
+class LiveSession:
+    """
+    One live connection's current inputs and output.
+
+    An init message sets the program and its full inputs and is answered with
+    the full output. Each patch message changes some inputs and is answered
+    with a JSON Patch against the previous output. Programs are rebuilt part
+    by part as for stored profiles (see ProgramParts), so a patch to one 5/3/1
+    lift's max only regenerates that lift. A rejected message leaves the
+    session as it was.
+    """
+
+    PROGRAMS = ["1rm", *PROGRAM_TYPES]
+
+    def __init__(self):
+        self.program: Optional[str] = None
+        self.format = OutputFormat.NESTED
+        self.params: Dict[str, Any] = {}
+        self.parts: Dict[str, tuple] = {}  # part -> (fingerprint, data)
+        self.output: Any = None
+
+    def handle(self, message: Dict[str, Any]) -> Dict:
+        kind = message.get("type")
+        reply = {"type": kind, "id": message.get("id")}
+        try:
+            if kind == "init":
+                program = message.get("program")
+                if program not in self.PROGRAMS:
+                    raise ValueError(f"Unknown program {program!r}. Use one of: {', '.join(self.PROGRAMS)}")
+                output_format = OutputFormat(message.get("format", OutputFormat.NESTED.value))
+                params, parts, output = self._compute(program, output_format, message.get("params") or {}, {})
+                self.program, self.format = program, output_format
+                reply.update(type="full", output=output)
+            elif kind == "patch":
+                if self.program is None:
+                    raise ValueError("Send an init message first.")
+                params, parts, output = self._compute(
+                    self.program, self.format, {**self.params, **(message.get("params") or {})}, self.parts
+                )
+                reply.update(type="diff", ops=json_diff(self.output, output))
+            else:
+                raise ValueError("Message type must be 'init' or 'patch'.")
+        except ValidationError as e:
+            return {"type": "error", "id": message.get("id"), "status_code": 422,
+                    "detail": e.errors(include_url=False, include_context=False)}
+        except HTTPException as e:
+            return {"type": "error", "id": message.get("id"), "status_code": e.status_code, "detail": e.detail}
+        except Exception as e:
+            return {"type": "error", "id": message.get("id"), "status_code": 400, "detail": str(e)}
+
+        self.params, self.parts, self.output = params, parts, output
+        return reply
+
+    def _compute(self, program: str, output_format: OutputFormat, params: Dict[str, Any], previous: Dict[str, tuple]) -> tuple:
+        count_generation(f"live_{program}")
+        if program == "1rm":
+            request = OneRMRequest.model_validate(params)
+            one_rm = calculate_1rm(request.weight, request.reps, request.formula)
+            table = generate_rm_table(one_rm, request.reps, request.weight, request.formula)
+            # Rows rather than the formatted text, so a change only resends the rows it touched
+            return request.model_dump(), {}, {"one_rm": round(one_rm, 2), "table": table}
+
+        model, _ = PROGRAM_TYPES[program]
+        params = model.model_validate(params).model_dump(mode="json")
+        generator = build_generator({"program": program, "params": params})
+        splitter = PROGRAM_PARTS.get(program, ProgramParts())
+        parts = {}
+        for part, fingerprint in splitter.fingerprints(params).items():
+            if part in previous and previous[part][0] == fingerprint:
+                parts[part] = previous[part]
+            else:
+                parts[part] = (fingerprint, splitter.build(generator, part))
+        output = splitter.assemble(generator, {part: data for part, (_, data) in parts.items()}, output_format)
+        return params, parts, output
+
 # Existing endpoints
+def one_rm_output(request: OneRMRequest) -> Dict:
+    one_rm = calculate_1rm(request.weight, request.reps, request.formula)
+    table = generate_rm_table(one_rm, request.reps, request.weight, request.formula)
+    return {"one_rm": round(one_rm, 2), "formatted_table": format_rm_table(table)}
+
 @app.post("/api/v1/calcs/1rm")
 def calculate_one_rm(request: OneRMRequest):
+    formula = request.formula.lower()
+    count_generation("1rm", formula if formula in ONE_RM_FORMULAS else "invalid")
     try:
-        one_rm = calculate_1rm(request.weight, request.reps, request.formula)
-        table = generate_rm_table(one_rm, request.reps, request.weight, request.formula)
-        
-        # Format the output
-        output = "Reps    Percent Weight\n"
-        output += "------------------------\n"
-        for row in table:
-            arrow = " <--" if row["is_input"] else ""
-            output += f"{row['reps']:<7} {row['percentage']:<7} {row['weight']}{arrow}\n"
-        
-        return {"one_rm": round(one_rm, 2), "formatted_table": output}
+        with timed_stage("generation"):
+            return one_rm_output(request)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/v1/calcs/1rm")
+def get_one_rm(http_request: Request, request: Annotated[OneRMRequest, Query()]):
+    formula = request.formula.lower()
+
+    def generate():
+        # Not counted when answered with 304
+        count_generation("1rm", formula if formula in ONE_RM_FORMULAS else "invalid")
+        return one_rm_output(request)
+
+    params = {"weight": request.weight, "reps": request.reps, "formula": formula}
+    return conditional_json_response(http_request, _canonical("1rm", params), generate)
+
+@app.post("/api/v1/calcs/1rm/bulk")
+def calculate_one_rm_bulk(request: OneRMBulkRequest):
+    # Per-entry failures are reported in place, mirroring the single endpoint's status codes
+    results = [None] * len(request.items)
+    valid_indices = []
+    valid_items = []
+    with timed_stage("validation"):
+        for i, item in enumerate(request.items):
+            try:
+                valid_items.append(OneRMRequest.model_validate(item))
+                valid_indices.append(i)
+            except ValidationError as e:
+                results[i] = {"index": i, "status_code": 422, "detail": e.errors(include_url=False, include_context=False)}
+
+    with timed_stage("generation"):
+        estimates = calculate_1rm_bulk(valid_items, request.include_tables)
+    for i, estimated in zip(valid_indices, estimates):
+        if "error" in estimated:
+            results[i] = {"index": i, "status_code": 400, "detail": estimated["error"]}
+        else:
+            results[i] = {"index": i, "status_code": 200, **estimated}
+    for formula, group in groupby(sorted(item.formula.lower() for item in valid_items)):
+        count_generation("1rm", formula if formula in ONE_RM_FORMULAS else "invalid", len(list(group)))
+
+    with timed_stage("serialization"):
+        body = render_json({
+            "count": len(results),
+            "failed": sum(1 for r in results if r["status_code"] != 200),
+            "results": results
+        })
+    return Response(content=body, media_type="application/json")
+
+@app.post("/api/v1/calcs/plates")
+def calculate_plates(request: PlateRequest):
+    try:
+        with timed_stage("generation"):
+            index = get_plate_index(request.inventory)
+            weights, loads = index.snap(request.weights)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "bar_weight": index.bar_weight,
+        "loads": [
+            {"target": target, "weight": weight, "plates": index.plates(load)}
+            for target, weight, load in zip(request.weights, weights.tolist(), loads.tolist())
+        ]
+    }
 
 # New HLM endpoints
 @app.post("/api/v1/programs/hlm/standard")
-def generate_hlm_standard(request: HLMStandardRequest):
-    try:
+def generate_hlm_standard(request: HLMStandardRequest, format: OutputFormat = OutputFormat.NESTED, analytics: bool = False):
+    def generate():
+        count_generation("hlm_standard")
         generator = HLMStandardGenerator(
             squat=request.squat,
             pull=request.pull,
             press=request.press,
             medium_reduction=request.medium_reduction,
-            light_reduction=request.light_reduction
+            light_reduction=request.light_reduction,
+            plates=request.plates
         )
-        return generator.generate()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        return render_program(generator, format, analytics)
+    return cached_json_response(canonical_hlm_standard(request) + ":" + format.value + analytics_key(analytics), generate)
+
+@app.get("/api/v1/programs/hlm/standard")
+def get_hlm_standard(http_request: Request, query: Annotated[HLMStandardQuery, Query()]):
+    request = HLMStandardRequest.model_validate(query.model_dump(exclude={"format", "analytics"}))
+    format, analytics = query.format, query.analytics
+    def generate():
+        count_generation("hlm_standard")
+        generator = HLMStandardGenerator(**request.model_dump())
+        return render_program(generator, format, analytics)
+    return conditional_json_response(http_request, canonical_hlm_standard(request) + ":" + format.value + analytics_key(analytics), generate)
 
 @app.post("/api/v1/programs/hlm/alternate")
-def generate_hlm_alternate(request: HLMAlternateRequest):
-    try:
+def generate_hlm_alternate(request: HLMAlternateRequest, format: OutputFormat = OutputFormat.NESTED, analytics: bool = False):
+    def generate():
+        count_generation("hlm_alternate")
         generator = HLMAlternatePressingGenerator(
             heavy_squat_name=request.heavy_squat_name,
             squat=request.squat,
@@ -491,15 +3719,58 @@ def generate_hlm_alternate(request: HLMAlternateRequest):
             light_pull_name=request.light_pull_name,
             medium_reduction=request.medium_reduction,
             light_reduction=request.light_reduction,
-            header_text=request.header_text
+            header_text=request.header_text,
+            plates=request.plates
         )
-        return generator.generate()
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        return render_program(generator, format, analytics)
+    return cached_json_response(canonical_hlm_alternate(request) + ":" + format.value + analytics_key(analytics), generate)
+
+@app.get("/api/v1/programs/hlm/alternate")
+def get_hlm_alternate(http_request: Request, query: Annotated[HLMAlternateQuery, Query()]):
+    request = HLMAlternateRequest.model_validate(query.model_dump(exclude={"format", "analytics"}))
+    format, analytics = query.format, query.analytics
+    def generate():
+        count_generation("hlm_alternate")
+        generator = HLMAlternatePressingGenerator(**request.model_dump())
+        return render_program(generator, format, analytics)
+    return conditional_json_response(http_request, canonical_hlm_alternate(request) + ":" + format.value + analytics_key(analytics), generate)
 
 # New Wendler 5/3/1 endpoint
 @app.post("/api/v1/programs/wendler531")
-def generate_wendler531(request: Wendler531Request):
+def generate_wendler531(request: Wendler531Request, format: OutputFormat = OutputFormat.NESTED, analytics: bool = False):
+    def generate():
+        count_generation("wendler531", template_label(request.templates))
+        generator = Wendler531Generator(
+            squat=request.squat,
+            bench=request.bench,
+            deadlift=request.deadlift,
+            press=request.press,
+            active_lifts=request.active_lifts,
+            max_type=request.max_type,
+            tm_percentage=request.tm_percentage,
+            header_text=request.header_text,
+            templates=request.templates,
+            fsl_params=request.fsl_params,
+            plates=request.plates
+        )
+        return render_program(generator, format, analytics)
+    return cached_json_response(canonical_wendler531(request, analytics) + ":" + format.value + analytics_key(analytics), generate)
+
+@app.get("/api/v1/programs/wendler531")
+def get_wendler531(http_request: Request, query: Annotated[Wendler531Query, Query()]):
+    request = query.to_request()
+    format, analytics = query.format, query.analytics
+    def generate():
+        count_generation("wendler531", template_label(request.templates))
+        generator = Wendler531Generator(**request.model_dump())
+        return render_program(generator, format, analytics)
+    return conditional_json_response(http_request, canonical_wendler531(request, analytics) + ":" + format.value + analytics_key(analytics), generate)
+
+@app.post("/api/v1/programs/wendler531/cycles")
+def generate_wendler531_cycles(request: Wendler531CyclesRequest):
+    # Validation happens here so bad input is a 400, not a broken stream
+    begin_handler()
+    count_generation("wendler531_cycles", template_label(request.templates))
     try:
         generator = Wendler531Generator(
             squat=request.squat,
@@ -511,15 +3782,368 @@ def generate_wendler531(request: Wendler531Request):
             tm_percentage=request.tm_percentage,
             header_text=request.header_text,
             templates=request.templates,
-            fsl_params=request.fsl_params
+            fsl_params=request.fsl_params,
+            plates=request.plates
+        )
+        records = generator.generate_cycles(
+            cycles=request.cycles,
+            tm_increments=request.tm_increments,
+            reset_every=request.reset_every,
+            reset_percentage=request.reset_percentage,
+            granularity=request.granularity
         )
-        return generator.generate()
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    return StreamingResponse(
+        (render_json(record) + b"\n" for record in records),
+        media_type="application/x-ndjson"
+    )
+
+@app.post("/api/v1/programs/wendler531/batch")
+def generate_wendler531_batch(request: Wendler531BatchRequest, format: OutputFormat = OutputFormat.NESTED):
+    # Per-athlete failures are reported in place, mirroring the single endpoint's status codes
+    results = [None] * len(request.athletes)
+    valid_indices = []
+    valid_params = []
+    with timed_stage("validation"):
+        for i, athlete in enumerate(request.athletes):
+            try:
+                parsed = Wendler531Request.model_validate(athlete)
+            except ValidationError as e:
+                results[i] = {"index": i, "status_code": 422, "detail": e.errors(include_url=False, include_context=False)}
+                continue
+            valid_indices.append(i)
+            valid_params.append(parsed.model_dump())
+
+    with timed_stage("generation"):
+        for i, built in zip(valid_indices, Wendler531Generator.build_batch(valid_params)):
+            if "error" in built:
+                results[i] = {"index": i, "status_code": 400, "detail": built["error"]}
+            else:
+                program = built["program"]
+                rendered = program.to_columnar() if format == OutputFormat.COLUMNAR else program.to_dict()
+                results[i] = {"index": i, "status_code": 200, "program": rendered}
+    for template, group in groupby(sorted(template_label(params["templates"]) for params in valid_params)):
+        count_generation("wendler531_batch", template, len(list(group)))
+
+    with timed_stage("serialization"):
+        body = render_json({
+            "count": len(results),
+            "failed": sum(1 for r in results if r["status_code"] != 200),
+            "results": results
+        })
+    return Response(content=body, media_type="application/json")
+
+@app.post("/api/v1/programs/wendler531/sweep")
+def sweep_wendler531(request: Wendler531SweepRequest):
+    count_generation("wendler531_sweep")
+    try:
+        lifts = request.active_lifts or Wendler531Generator.LIFTS
+        unknown = set(lifts) - set(Wendler531Generator.LIFTS)
+        if unknown:
+            raise ValueError(f"Unknown lifts: {sorted(unknown)}")
+        maxes = {lift: sweep_values(lift, getattr(request, lift)) for lift in dict.fromkeys(lifts)}
+        tm_percentages = sweep_values("tm_percentage", request.tm_percentage)
+        check_sweep_size(len(tm_percentages) * sum(len(values) for values in maxes.values()))
+        with timed_stage("generation"):
+            return Wendler531Generator.sweep(maxes, tm_percentages, request.max_type, request.plates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/v1/programs/hlm/standard/sweep")
+def sweep_hlm_standard(request: HLMStandardSweepRequest):
+    count_generation("hlm_standard_sweep")
+    try:
+        axes = {
+            name: sweep_values(name, getattr(request, name))
+            for name in ("squat", "pull", "press", "medium_reduction", "light_reduction")
+        }
+        check_sweep_size(int(np.prod([len(values) for values in axes.values()])))
+        with timed_stage("generation"):
+            return HLMStandardGenerator.sweep(axes, request.plates)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/v1/analytics/compare")
+def compare_program_analytics(request: AnalyticsCompareRequest):
+    if len(request.programs) > ANALYTICS_MAX_PROGRAMS:
+        raise HTTPException(status_code=400, detail=f"At most {ANALYTICS_MAX_PROGRAMS} programs can be compared at once.")
+    count_generation("analytics", amount=len(request.programs))
+    with timed_stage("generation"):
+        output = compare_analytics(request.programs)
+    with timed_stage("serialization"):
+        body = render_json(output)
+    return Response(content=body, media_type="application/json")
+
+# Declarative program endpoints
+@app.get("/api/v1/programs/definitions")
+def list_program_definitions():
+    return {name: plan.describe() for name, plan in PROGRAM_PLANS.items()}
+
+@app.post("/api/v1/programs/definitions/{name}")
+def generate_defined(name: str, request: DefinedProgramRequest, format: OutputFormat = OutputFormat.NESTED, analytics: bool = False):
+    plan = PROGRAM_PLANS.get(name)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=f"Unknown program '{name}'. Use one of: {', '.join(PROGRAM_PLANS)}")
+
+    def generate():
+        count_generation(name)
+        return generate_defined_program(plan, request, format == OutputFormat.COLUMNAR, analytics)
+    key = _canonical(f"definitions/{name}", request.model_dump(mode="json")) + ":" + format.value + analytics_key(analytics)
+    return cached_json_response(key, generate)
+
+@app.post("/api/v1/jobs", status_code=202)
+def create_job(request: JobRequest):
+    if not request.requests:
+        raise HTTPException(status_code=400, detail="A job needs at least one request.")
+    if len(request.requests) > JOB_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"A job can hold at most {JOB_MAX_ITEMS} requests.")
+    if not (1 <= request.chunk_size <= 10000):
+        raise HTTPException(status_code=400, detail="chunk_size must be between 1 and 10000.")
+    job = job_manager.submit(request.requests, request.chunk_size)
+    return job.progress()
+
+def _get_job(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+@app.get("/api/v1/jobs/{job_id}")
+def get_job(job_id: str):
+    return _get_job(job_id).progress()
+
+@app.get("/api/v1/jobs/{job_id}/results")
+def get_job_results(job_id: str, offset: int = 0, limit: int = 500):
+    # Finished results in [offset, offset + limit); unfinished ones are skipped
+    job = _get_job(job_id)
+    if offset < 0 or not (1 <= limit <= 10000):
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 10000.")
+    with job.lock:
+        page = [result for result in job.results[offset:offset + limit] if result is not None]
+        total = len(job.results)
+    # Results are stored encoded; splice them into the envelope
+    envelope = render_json({
+        "job_id": job.id,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "next_offset": offset + limit if offset + limit < total else None,
+        "results": []
+    })
+    body = envelope[:-3] + b"[" + b",".join(page) + b"]}"
+    return Response(content=body, media_type="application/json")
+
+@app.delete("/api/v1/jobs/{job_id}")
+def cancel_job(job_id: str):
+    _get_job(job_id)
+    return job_manager.cancel(job_id).progress()
+
+@app.post("/api/v1/exports/{export_format}")
+def export_programs(export_format: str, request: ExportRequest):
+    export, media_type, disposition = EXPORT_FORMATS.get(export_format, (None, None, None))
+    if export is None:
+        raise HTTPException(status_code=404, detail=f"Unknown export format. Use one of: {', '.join(EXPORT_FORMATS)}")
+
+    # Parameters are validated before the first byte is sent; generators are
+    # only built as the stream reaches them, and any that fail then get an
+    # error row in place of their program.
+    programs = []
+    for i, item in enumerate(request.programs):
+        try:
+            programs.append((item["program"], program_factory(item)))
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail={"index": i, "errors": e.errors(include_url=False, include_context=False)})
+        except Exception as e:
+            raise HTTPException(status_code=400, detail={"index": i, "error": str(e)})
+
+    return StreamingResponse(export(programs), media_type=media_type, headers={"Content-Disposition": disposition})
+
+@app.post("/api/v1/logs/ingest")
+async def ingest_training_log(request: Request, format: str = "csv", formula: str = "epley"):
+    # The body is the raw log (CSV with a header row, or NDJSON), read as it arrives
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ndjson'.")
+    ingestion = LogIngestion(training_logs, format, get_formula(formula))
+    async for chunk in request.stream():
+        await run_in_threadpool(ingestion.feed, chunk)
+    return await run_in_threadpool(ingestion.finish)
+
+@app.get("/api/v1/athletes/{athlete}/maxes")
+def get_athlete_maxes(athlete: str):
+    return {"athlete": athlete, "maxes": training_logs.athlete_maxes(athlete), "lifts": training_logs.athlete_summary(athlete)}
+
+def _logged_params(athlete: str, lifts: Dict[str, str], required: List[str], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    # Fill request fields from logged maxes; explicit values in the body win
+    maxes = training_logs.athlete_maxes(athlete)
+    params = {}
+    for field_name, lift in lifts.items():
+        if field_name in overrides:
+            continue
+        if lift in maxes:
+            params[field_name] = maxes[lift]
+        elif lift in required:
+            raise HTTPException(status_code=400, detail=f"No logged sets for {athlete}'s {lift}.")
+        else:
+            params[field_name] = 0.0
+    params.update(overrides)
+    return params
+
+@app.post("/api/v1/athletes/{athlete}/programs/wendler531")
+def generate_athlete_wendler531(athlete: str, overrides: Dict[str, Any] = Body(default={}), format: OutputFormat = OutputFormat.NESTED):
+    active_lifts = overrides.get("active_lifts") or Wendler531Generator.LIFTS
+    params = _logged_params(athlete, {lift: lift for lift in Wendler531Generator.LIFTS}, active_lifts, overrides)
+    params.setdefault("max_type", MaxType.ONERM.value)
+    try:
+        request = Wendler531Request.model_validate(params)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    return generate_wendler531(request, format)
+
+@app.post("/api/v1/athletes/{athlete}/programs/hlm/standard")
+def generate_athlete_hlm_standard(athlete: str, overrides: Dict[str, Any] = Body(default={}), format: OutputFormat = OutputFormat.NESTED):
+    lifts = {"squat": "squat", "pull": "deadlift", "press": "press"}
+    params = _logged_params(athlete, lifts, list(lifts.values()), overrides)
+    try:
+        request = HLMStandardRequest.model_validate(params)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    return generate_hlm_standard(request, format)
+
+# Athlete profile endpoints
+@app.get("/api/v1/athletes/{athlete}/profile")
+def get_athlete_profile(athlete: str):
+    return {"athlete": athlete, "programs": profile_store.profiles(athlete)}
+
+def _save_profile(athlete: str, program: str, params: Dict[str, Any], merge: bool):
+    count_generation(f"profile_{program}" if program in PROGRAM_TYPES else "profile_invalid")
+    try:
+        with timed_stage("generation"):
+            return profile_store.save(athlete, program, params, merge=merge)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    except ProfileNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except sqlite3.Error:
+        raise
+    except Exception as e:
+        # Same as the stateless generator routes
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.put("/api/v1/athletes/{athlete}/profile/{program}")
+def put_athlete_profile(athlete: str, program: str, params: Dict[str, Any] = Body(...)):
+    return _save_profile(athlete, program, params, merge=False)
+
+@app.patch("/api/v1/athletes/{athlete}/profile/{program}")
+def patch_athlete_profile(athlete: str, program: str, params: Dict[str, Any] = Body(...)):
+    # Only the fields sent change; parts of the program that don't depend on them are kept
+    return _save_profile(athlete, program, params, merge=True)
+
+@app.get("/api/v1/athletes/{athlete}/profile/{program}/program")
+def get_athlete_profile_program(athlete: str, program: str, format: OutputFormat = OutputFormat.NESTED):
+    with timed_stage("generation"):
+        body = profile_store.rendered(athlete, program, format)
+    if body is None:
+        raise HTTPException(status_code=404, detail=f"No {program} profile for {athlete}.")
+    return Response(content=body, media_type="application/json")
+
+@app.delete("/api/v1/athletes/{athlete}/profile/{program}")
+def delete_athlete_profile(athlete: str, program: str):
+    if not profile_store.delete(athlete, program):
+        raise HTTPException(status_code=404, detail=f"No {program} profile for {athlete}.")
+    return {"athlete": athlete, "program": program, "deleted": True}
+
+@app.websocket("/api/v1/live")
+async def live_recalculation(websocket: WebSocket):
+    # Same origins as the CORS policy; browsers don't apply CORS to WebSockets
+    origin = websocket.headers.get("origin")
+    if origin is not None and origin not in origins:
+        await websocket.close(code=1008)
+        return
+
+    await websocket.accept()
+    session = LiveSession()
+    try:
+        while True:
+            text = await websocket.receive_text()
+            if len(text.encode()) > LIVE_MAX_MESSAGE_BYTES:
+                await websocket.close(code=1009, reason=f"Messages are limited to {LIVE_MAX_MESSAGE_BYTES} bytes.")
+                return
+            try:
+                message = json.loads(text)
+                if not isinstance(message, dict):
+                    raise ValueError("Messages must be JSON objects.")
+            except ValueError as e:
+                reply = {"type": "error", "id": None, "status_code": 400, "detail": str(e)}
+            else:
+                # Generation and diffing are CPU work; keep them off the event loop
+                reply = await run_in_threadpool(session.handle, message)
+            await websocket.send_text(render_json(reply).decode())
+    except WebSocketDisconnect:
+        pass
+
+@app.get("/api/v1/cache/stats")
+def cache_stats():
+    return response_cache.stats()
+
+@app.get("/api/v1/admission/stats")
+def admission_stats():
+    return admission.stats()
+
+@app.get("/metrics")
+def metrics():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    cache = response_cache.stats()
+    for name in ("hits", "misses", "coalesced", "evictions", "expirations"):
+        lines.append(f"# TYPE iron_response_cache_{name}_total counter")
+        lines.append(f"iron_response_cache_{name}_total {cache[name]}")
+    lines.append("# TYPE iron_response_cache_entries gauge")
+    lines.append(f"iron_response_cache_entries {cache['size']}")
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# Request profiling endpoints; 404 unless profiling is on with a token, since
+# sampled profiles expose code paths and timings
+def get_request_profiler(request: Request) -> RequestProfiler:
+    if request_profiler is None or not request_profiler.token:
+        raise HTTPException(status_code=404, detail="Request profiling is not enabled.")
+    if not request_profiler.authorized(request):
+        raise HTTPException(status_code=403, detail="A valid X-Profile-Token header is required.")
+    return request_profiler
+
+@app.get("/api/v1/admin/profiles")
+def list_request_profiles(profiler: RequestProfiler = Depends(get_request_profiler)):
+    return {"directory": profiler.directory, "profiles": profiler.profiles()}
+
+@app.get("/api/v1/admin/profiles/summary")
+def summarize_request_profiles(route: Optional[str] = None, limit: int = 30, profiler: RequestProfiler = Depends(get_request_profiler)):
+    # Merged over every saved profile, or those of one route
+    names = [meta["name"] for meta in profiler.profiles() if route is None or meta.get("route") == route]
+    return {"route": route, **profiler.summary(names, limit)}
+
+@app.get("/api/v1/admin/profiles/{name}")
+def get_request_profile(name: str, limit: int = 30, profiler: RequestProfiler = Depends(get_request_profiler)):
+    try:
+        return {**profiler.meta(name), **profiler.summary([name], limit)}
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"No profile named '{name}'")
+
+@app.get("/api/v1/admin/profiles/{name}/download")
+def download_request_profile(name: str, profiler: RequestProfiler = Depends(get_request_profiler)):
+    # Raw pstats file, for snakeviz or python -m pstats
+    try:
+        path = profiler.prof_path(name)
+    except LookupError:
+        raise HTTPException(status_code=404, detail=f"No profile named '{name}'")
+    return FileResponse(path, media_type="application/octet-stream", filename=name + ".prof")
+
 @app.post("/api/v1/echo")
 def echo_data(data: dict):
     return {"received_data": data}
 
 if __name__ == "__main__":
+    # Single process for development; serve.py is the production entry point
     uvicorn.run(app, host="0.0.0.0", port=9000)
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""
+Production entry point for the API.
+
+    python serve.py [--workers 1] [--port 9000] [--max-requests 0]
+
+The app is imported once in this process and workers are forked from it, so
+each starts with the app already loaded. All workers accept on one shared
+listening socket. Each worker is a uvicorn server using uvloop and httptools
+when they are installed (uvicorn[standard]), falling back to asyncio and h11.
+JSON is rendered by the app's orjson-backed default response class, and
+responses over GZIP_MINIMUM_SIZE bytes are gzipped for clients that accept it.
+
+With --max-requests set, a worker exits after that many requests (plus a
+random jitter, so they don't all restart at once) and is replaced with a
+fresh fork. A worker that dies for any other reason is replaced as well.
+On SIGTERM or SIGINT every worker stops accepting, finishes in-flight
+requests within --graceful-timeout seconds and runs the app's shutdown
+hooks; workers still running after that are killed.
+
+Every option can also be set from the environment (WEB_CONCURRENCY,
+HOST, PORT, BACKLOG, KEEP_ALIVE, MAX_REQUESTS, MAX_REQUESTS_JITTER,
+GRACEFUL_TIMEOUT).
+
+Workers share nothing: the response cache, metrics, bulk jobs and ingested
+training logs live in the worker that handled the request, and the admission
+control limits (ADMISSION_CAPACITY and friends) apply per worker. Recycling
+a worker drops its jobs and training logs. So the defaults are one worker
+that is never recycled; only raise --workers or set --max-requests when
+nothing relies on /api/v1/jobs or the logged-athlete endpoints, or when
+requests are routed by athlete/job upstream. Athlete profiles are in SQLite
+and are shared.
+
+Throughput against the previous launch path (`uvicorn main:app`: one process,
+asyncio loop, h11), requests per second with 16 keep-alive connections and
+the response cache disabled (RESPONSE_CACHE_SIZE=0). Measured on a single
+vCPU, with the load generator on the same core:
+
+    route                                  uvicorn main:app   serve.py -w 1
+    POST /api/v1/calcs/1rm                 950-1180           1320-1640
+    POST /api/v1/programs/wendler531       630-820            1150-1300
+    POST /api/v1/programs/wendler531/batch 22-25              23-24
+
+With one worker the gain comes from uvloop and httptools. It is largest on
+small requests, where serving overhead dominates. Batch requests are bound
+by generation, so they see no gain. More workers only help when there are
+more cores: on this machine `-w 2` measured slightly below `-w 1`. When
+more workers are safe (see above), size --workers to the cores the
+container actually gets.
+"""
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import time
+from typing import Dict
+
+import uvicorn
+
+import main
+
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=env("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(env("PORT", 9000)))
+    parser.add_argument("--workers", "-w", type=int, default=int(env("WEB_CONCURRENCY", 1)),
+                        help="worker processes; each keeps its own jobs and training logs")
+    parser.add_argument("--backlog", type=int, default=int(env("BACKLOG", 2048)),
+                        help="pending connections the listening socket will queue")
+    parser.add_argument("--keep-alive", type=int, default=int(env("KEEP_ALIVE", 75)),
+                        help="seconds an idle keep-alive connection is held open; keep above the proxy's")
+    parser.add_argument("--max-requests", type=int, default=int(env("MAX_REQUESTS", 0)),
+                        help="recycle a worker after this many requests, 0 to never recycle")
+    parser.add_argument("--max-requests-jitter", type=int, default=int(env("MAX_REQUESTS_JITTER", 1000)))
+    parser.add_argument("--graceful-timeout", type=int, default=int(env("GRACEFUL_TIMEOUT", 30)),
+                        help="seconds workers get to finish in-flight requests on shutdown")
+    return parser.parse_args(argv)
+
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def worker_config(args) -> uvicorn.Config:
+    max_requests = None
+    if args.max_requests:
+        max_requests = args.max_requests + random.randint(0, max(args.max_requests_jitter, 0))
+    return uvicorn.Config(
+        main.app,
+        loop="auto",
+        http="auto",
+        backlog=args.backlog,
+        timeout_keep_alive=args.keep_alive,
+        limit_max_requests=max_requests,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        access_log=False,
+    )
+
+
+def run_worker(sock: socket.socket, args):
+    # Runs in the forked child; uvicorn installs its own SIGTERM/SIGINT handlers
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    random.seed()
+    status = 0
+    try:
+        uvicorn.Server(worker_config(args)).run(sockets=[sock])
+    except BaseException:
+        status = 1
+    finally:
+        os._exit(status)
+
+
+class Supervisor:
+    """Keeps `workers` forked servers running until told to stop."""
+
+    def __init__(self, sock: socket.socket, args):
+        self.sock = sock
+        self.args = args
+        self.workers: Dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(self.sock, self.args)
+        self.workers[pid] = time.monotonic()
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def reap(self):
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+            started = self.workers.pop(pid, None)
+            if started is not None and not self.stopping and time.monotonic() - started < 1:
+                # Dying straight after the fork means it will keep dying; back off
+                time.sleep(1)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.args.workers):
+            self.spawn()
+
+        while not self.stopping:
+            time.sleep(0.2)
+            self.reap()
+            while not self.stopping and len(self.workers) < self.args.workers:
+                self.spawn()
+
+        self.shutdown()
+
+    def shutdown(self):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+        # Allow for the app's shutdown hooks on top of the request drain
+        deadline = time.monotonic() + self.args.graceful_timeout + 5
+        while self.workers and time.monotonic() < deadline:
+            time.sleep(0.1)
+            self.reap()
+
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.workers < 1:
+        sys.exit("--workers must be at least 1")
+    sock = bind_socket(args.host, args.port, args.backlog)
+    print(f"Serving on {args.host}:{args.port} with {args.workers} worker(s)", flush=True)
+    Supervisor(sock, args).run()
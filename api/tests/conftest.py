@@ -0,0 +1,25 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its configuration from the environment at import time
+DATA_DIR = tempfile.mkdtemp(prefix="iron-tests-")
+os.environ.setdefault("PROFILE_DB", os.path.join(DATA_DIR, "profiles.db"))
+os.environ.setdefault("PROFILING_DIR", os.path.join(DATA_DIR, "request_profiles"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import main  # noqa: E402
+
+MAXES = {"squat": 140.0, "bench": 100.0, "deadlift": 180.0, "press": 60.0}
+
+
+@pytest.fixture
+def client():
+    main.response_cache.clear()
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,113 @@
+import asyncio
+import math
+
+import pytest
+
+import main
+from conftest import MAXES
+from main import AdmissionGate, Overloaded
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_requests_beyond_the_limit_wait_for_a_release():
+    async def scenario():
+        gate = AdmissionGate("test", limit=1, queue_size=1)
+        await gate.acquire(bulk=False, timeout=1)
+        waiter = asyncio.create_task(gate.acquire(bulk=False, timeout=1))
+        await asyncio.sleep(0)
+        assert gate.waiting == 1
+        gate.release(bulk=False)
+        await waiter
+        return gate.stats()
+    stats = run(scenario())
+    assert stats["in_use"] == 1
+    assert stats["waiting"] == 0
+    assert stats["admitted"] == 2
+
+
+def test_full_queue_rejects_at_once():
+    async def scenario():
+        gate = AdmissionGate("test", limit=1, queue_size=0)
+        await gate.acquire(bulk=False, timeout=1)
+        with pytest.raises(Overloaded) as e:
+            await gate.acquire(bulk=False, timeout=1)
+        return e.value.reason, gate.stats()
+    reason, stats = run(scenario())
+    assert reason == "queue_full"
+    assert stats["rejected"] == {"queue_full": 1, "timeout": 0}
+
+
+def test_waiting_too_long_is_rejected():
+    async def scenario():
+        gate = AdmissionGate("test", limit=1, queue_size=1)
+        await gate.acquire(bulk=False, timeout=1)
+        with pytest.raises(Overloaded) as e:
+            await gate.acquire(bulk=False, timeout=0.01)
+        return e.value.reason, gate.stats()
+    reason, stats = run(scenario())
+    assert reason == "timeout"
+    assert stats["waiting"] == 0
+
+
+def test_interactive_requests_are_admitted_before_bulk():
+    async def scenario():
+        gate = AdmissionGate("test", limit=1, queue_size=2)
+        await gate.acquire(bulk=False, timeout=1)
+        order = []
+
+        async def wait(bulk):
+            await gate.acquire(bulk=bulk, timeout=1)
+            order.append("bulk" if bulk else "interactive")
+        bulk = asyncio.create_task(wait(True))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(wait(False))
+        await asyncio.sleep(0)
+        gate.release(bulk=False)
+        await interactive
+        gate.release(bulk=False)
+        await bulk
+        return order
+    assert run(scenario()) == ["interactive", "bulk"]
+
+
+def test_bulk_requests_leave_slots_for_interactive_ones():
+    async def scenario():
+        gate = AdmissionGate("test", limit=2, queue_size=1, bulk_limit=1)
+        await gate.acquire(bulk=True, timeout=1)
+        with pytest.raises(Overloaded):
+            await gate.acquire(bulk=True, timeout=0.01)
+        await gate.acquire(bulk=False, timeout=0.01)
+        return gate.stats()
+    stats = run(scenario())
+    assert stats["in_use"] == 2
+    assert stats["bulk_in_use"] == 1
+
+
+@pytest.fixture
+def saturated(monkeypatch):
+    monkeypatch.setattr(main.admission, "shared", AdmissionGate("shared", limit=0, queue_size=0))
+
+
+def test_saturated_app_answers_503_with_retry_after(client, saturated):
+    response = client.post("/api/v1/programs/wendler531", json=MAXES)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == str(math.ceil(main.ADMISSION_INTERACTIVE_WAIT))
+    assert response.json() == {"detail": "The server is busy. Retry later."}
+
+
+def test_monitoring_routes_skip_admission(client, saturated):
+    assert client.get("/api/v1/admission/stats").status_code == 200
+    assert client.get("/api/v1/cache/stats").status_code == 200
+    assert client.get("/metrics").status_code == 200
+
+
+def test_slots_are_released_after_responses(client):
+    client.post("/api/v1/programs/wendler531", json=MAXES)
+    client.post("/api/v1/exports/csv", json={"programs": [{"program": "wendler531", "params": MAXES}]})
+    client.post("/api/v1/programs/wendler531", json={"squat": "heavy"})
+    stats = client.get("/api/v1/admission/stats").json()
+    assert stats["shared"]["in_use"] == 0
+    assert stats["routes"]["/api/v1/exports/{export_format}"]["in_use"] == 0
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from conftest import MAXES
+from main import ResponseCache
+
+
+def test_repeated_key_is_a_hit():
+    cache = ResponseCache(maxsize=4)
+    calls = []
+    for _ in range(3):
+        assert cache.get_or_compute("a", lambda: calls.append(1) or b"body") == b"body"
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(maxsize=2)
+    cache.get_or_compute("a", lambda: b"a")
+    cache.get_or_compute("b", lambda: b"b")
+    cache.get_or_compute("a", lambda: b"a")
+    cache.get_or_compute("c", lambda: b"c")
+    assert cache.get_or_compute("a", lambda: b"recomputed") == b"a"
+    assert cache.get_or_compute("b", lambda: b"recomputed") == b"recomputed"
+    assert cache.stats()["evictions"] == 2
+
+
+def test_expired_entry_is_recomputed():
+    cache = ResponseCache(maxsize=4, ttl=0.01)
+    cache.get_or_compute("a", lambda: b"old")
+    time.sleep(0.02)
+    assert cache.get_or_compute("a", lambda: b"new") == b"new"
+    assert cache.stats()["expirations"] == 1
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache(maxsize=4)
+
+    def fail():
+        raise ValueError("bad input")
+    with pytest.raises(ValueError):
+        cache.get_or_compute("a", fail)
+    assert cache.get_or_compute("a", lambda: b"ok") == b"ok"
+
+
+def test_zero_size_cache_stores_nothing():
+    cache = ResponseCache(maxsize=0)
+    cache.get_or_compute("a", lambda: b"a")
+    assert cache.get_or_compute("a", lambda: b"again") == b"again"
+    assert cache.stats()["size"] == 0
+
+
+def test_concurrent_requests_share_one_computation():
+    cache = ResponseCache(maxsize=4)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return b"shared"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(cache.get_or_compute("a", compute)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(cache.get_or_compute("a", compute))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    while cache.stats()["coalesced"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    assert results == [b"shared"] * 4
+    assert len(calls) == 1
+
+
+def test_route_serves_repeats_from_the_cache(client):
+    before = client.get("/api/v1/cache/stats").json()
+    first = client.post("/api/v1/programs/wendler531", json=MAXES)
+    second = client.post("/api/v1/programs/wendler531", json=dict(reversed(list(MAXES.items()))))
+    after = client.get("/api/v1/cache/stats").json()
+    assert first.content == second.content
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_generator_errors_are_not_cached(client):
+    body = dict(MAXES, templates=["fsl"], fsl_params={"sets": 9, "reps": 5})
+    for _ in range(2):
+        response = client.post("/api/v1/programs/wendler531", json=body)
+        assert response.status_code == 400
+        assert response.json() == {"detail": "FSL sets must be between 3 and 8."}
+    assert client.get("/api/v1/cache/stats").json()["size"] == 0
@@ -0,0 +1,51 @@
+import main
+
+PARAMS = {"weight": 100, "reps": 5, "formula": "epley"}
+
+
+def generations():
+    return sum(main.GENERATOR_CALLS._values.values())
+
+
+def test_get_sends_etag_and_cache_control(client):
+    response = client.get("/api/v1/calcs/1rm", params=PARAMS)
+    assert response.status_code == 200
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == main.HTTP_CACHE_CONTROL
+
+
+def test_etag_depends_on_the_input(client):
+    first = client.get("/api/v1/calcs/1rm", params=PARAMS).headers["etag"]
+    assert client.get("/api/v1/calcs/1rm", params=PARAMS).headers["etag"] == first
+    assert client.get("/api/v1/calcs/1rm", params=dict(PARAMS, reps=6)).headers["etag"] != first
+
+
+def test_matching_if_none_match_is_not_modified(client):
+    etag = client.get("/api/v1/calcs/1rm", params=PARAMS).headers["etag"]
+    before = generations()
+    for if_none_match in (etag, "W/" + etag, f'"other", {etag}', "*"):
+        response = client.get("/api/v1/calcs/1rm", params=PARAMS, headers={"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["cache-control"] == main.HTTP_CACHE_CONTROL
+    assert generations() == before
+
+
+def test_stale_if_none_match_gets_the_body(client):
+    response = client.get("/api/v1/calcs/1rm", params=PARAMS, headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == client.post("/api/v1/calcs/1rm", json=PARAMS).content
+
+
+def test_gzip_variant_has_its_own_etag(client):
+    params = {"squat": 140.0, "bench": 100.0, "deadlift": 180.0, "press": 60.0}
+    plain = client.get("/api/v1/programs/wendler531", params=params, headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/api/v1/programs/wendler531", params=params, headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+
+    # Either variant validates, and the 304 names the one the client holds
+    for etag in (plain.headers["etag"], gzipped.headers["etag"]):
+        response = client.get("/api/v1/programs/wendler531", params=params, headers={"If-None-Match": etag, "Accept-Encoding": "gzip"})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+import main
+from conftest import MAXES
+from main import Job, JobManager, JobStatus
+
+HLM = {"squat": 150, "pull": 180, "press": 80, "medium_reduction": 0.1, "light_reduction": 0.2}
+
+
+def wait_for(job: Job, timeout: float = 60) -> Job:
+    deadline = time.monotonic() + timeout
+    while job.finished_at is None:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return job
+
+
+@pytest.fixture(scope="module")
+def manager():
+    # One pool for the module; starting worker processes is the slow part
+    manager = JobManager(workers=1, concurrency=2, max_running=2, history=100, start_method=main.job_manager.start_method,
+                         max_result_bytes=1 << 30)
+    yield manager
+    manager.shutdown()
+
+
+def test_results_match_the_routes(client, manager):
+    items = [
+        {"program": "wendler531", "params": MAXES},
+        {"program": "hlm_standard", "params": HLM},
+        {"program": "wendler531", "params": {"squat": "heavy"}},
+        {"program": "madcow", "params": {}},
+    ]
+    job = wait_for(manager.submit(items, chunk_size=3))
+    assert job.progress()["status"] == JobStatus.COMPLETED.value
+    assert (job.completed, job.failed) == (4, 2)
+
+    expected = [
+        b'{"index":0,"status_code":200,"program":' + client.post("/api/v1/programs/wendler531", json=MAXES).content + b"}",
+        b'{"index":1,"status_code":200,"program":' + client.post("/api/v1/programs/hlm/standard", json=HLM).content + b"}",
+    ]
+    assert job.results[:2] == expected
+    assert job.results[3] == b'{"index":3,"status_code":400,"detail":"Unknown program \'madcow\'. Use one of: wendler531, hlm_standard, hlm_alternate"}'
+    assert job.results[2].startswith(b'{"index":2,"status_code":422,')
+    assert job.result_bytes == sum(len(result) for result in job.results)
+    assert job.items == [None] * 4
+
+
+def test_finished_jobs_are_pruned_oldest_first(manager):
+    small = JobManager(workers=1, concurrency=1, max_running=1, history=2, start_method=manager.start_method,
+                       max_result_bytes=1 << 30)
+    small._executor = manager._get_executor()
+    jobs = [wait_for(small.submit([{"program": "hlm_standard", "params": HLM}], chunk_size=1)) for _ in range(3)]
+    assert [small.get(job.id) for job in jobs] == [None, jobs[1], jobs[2]]
+
+    small.max_result_bytes = jobs[2].result_bytes
+    with small._lock:
+        small._prune()
+    assert [small.get(job.id) for job in jobs] == [None, None, jobs[2]]
+
+
+def test_cancelled_job_stops_submitting_chunks(manager):
+    # Hold the running slots so the job stays queued until it is cancelled
+    blocked = JobManager(workers=1, concurrency=1, max_running=1, history=10, start_method=manager.start_method,
+                         max_result_bytes=1 << 30)
+    blocked._executor = manager._get_executor()
+    blocked._running.acquire()
+    job = blocked.submit([{"program": "hlm_standard", "params": HLM}] * 10, chunk_size=1)
+    blocked.cancel(job.id)
+    blocked._running.release()
+    wait_for(job)
+    assert job.progress()["status"] == JobStatus.CANCELLED.value
+    assert job.completed == 0
+
+
+def test_job_routes(client):
+    response = client.post("/api/v1/jobs", json={"requests": [{"program": "hlm_standard", "params": HLM}] * 5, "chunk_size": 2})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    wait_for(main.job_manager.get(job_id))
+
+    assert client.get(f"/api/v1/jobs/{job_id}").json()["status"] == "completed"
+    page = client.get(f"/api/v1/jobs/{job_id}/results", params={"offset": 1, "limit": 3}).json()
+    assert (page["total"], page["next_offset"]) == (5, 4)
+    assert [result["index"] for result in page["results"]] == [1, 2, 3]
+    assert client.get("/api/v1/jobs/missing").status_code == 404
+    assert client.post("/api/v1/jobs", json={"requests": []}).status_code == 400
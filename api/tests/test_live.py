@@ -0,0 +1,122 @@
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import main
+from conftest import MAXES
+from main import LiveSession, json_diff
+
+
+def apply_patch(document, ops):
+    # Enough of RFC 6902 for what json_diff sends
+    document = json.loads(json.dumps(document))
+    for op in ops:
+        *parents, last = [part.replace("~1", "/").replace("~0", "~") for part in op["path"].split("/")[1:]] or [None]
+        if last is None:
+            document = op["value"]
+            continue
+        target = document
+        for part in parents:
+            target = target[int(part) if isinstance(target, list) else part]
+        key = int(last) if isinstance(target, list) else last
+        if op["op"] == "remove":
+            del target[key]
+        else:
+            target[key] = op["value"]
+    return document
+
+
+@pytest.mark.parametrize("old, new", [
+    ({"a": 1, "b": [1, 2]}, {"a": 2, "b": [1, 3]}),
+    ({"a": 1, "b": 2}, {"a": 1, "c": 3}),
+    ({"a": [1, 2]}, {"a": [1, 2, 3]}),
+    ({"a/b": {"~": 1}}, {"a/b": {"~": 2}}),
+    ([1], {"a": 1}),
+])
+def test_json_diff_turns_old_into_new(old, new):
+    assert apply_patch(old, json_diff(old, new)) == new
+
+
+def test_unchanged_values_send_no_ops():
+    assert json_diff({"a": [1, {"b": 2}]}, {"a": [1, {"b": 2}]}) == []
+
+
+def test_patch_reaches_the_output_of_a_fresh_init():
+    session = LiveSession()
+    full = session.handle({"type": "init", "id": 1, "program": "wendler531", "params": MAXES})
+    assert full["type"] == "full"
+    diff = session.handle({"type": "patch", "id": 2, "params": {"squat": 150.0}})
+    assert diff["type"] == "diff"
+    assert {op["path"].split("/")[1] for op in diff["ops"]} == {"training_maxes", "program"}
+
+    fresh = LiveSession().handle({"type": "init", "program": "wendler531", "params": dict(MAXES, squat=150.0)})
+    assert apply_patch(full["output"], diff["ops"]) == fresh["output"]
+
+
+def test_init_output_matches_the_route(client):
+    full = LiveSession().handle({"type": "init", "program": "wendler531", "params": dict(MAXES, templates=["widowmaker"])})
+    route = client.post("/api/v1/programs/wendler531", json=dict(MAXES, templates=["widowmaker"]))
+    assert full["output"] == route.json()
+
+
+def test_patch_regenerates_only_the_changed_lift():
+    session = LiveSession()
+    session.handle({"type": "init", "program": "wendler531", "params": MAXES})
+    before = dict(session.parts)
+    session.handle({"type": "patch", "params": {"bench": 105.0}})
+    changed = {part for part in session.parts if session.parts[part] is not before.get(part)}
+    assert changed == {"bench"}
+
+
+def test_rejected_patch_leaves_the_session_as_it_was():
+    session = LiveSession()
+    session.handle({"type": "init", "program": "1rm", "params": {"weight": 100, "reps": 5, "formula": "epley"}})
+    output = session.output
+    error = session.handle({"type": "patch", "id": 3, "params": {"reps": "many"}})
+    assert error["type"] == "error"
+    assert error["id"] == 3
+    assert error["status_code"] == 422
+    assert session.output is output
+    assert session.handle({"type": "patch", "params": {"weight": 100}})["ops"] == []
+
+
+@pytest.mark.parametrize("message, detail", [
+    ({"type": "patch"}, "Send an init message first."),
+    ({"type": "init", "program": "madcow"}, "Unknown program 'madcow'"),
+    ({"type": "reset"}, "Message type must be 'init' or 'patch'."),
+])
+def test_bad_messages_are_errors(message, detail):
+    reply = LiveSession().handle(message)
+    assert reply["status_code"] == 400
+    assert reply["detail"].startswith(detail)
+
+
+def test_websocket_round_trip(client):
+    with client.websocket_connect("/api/v1/live") as websocket:
+        websocket.send_text(json.dumps({"type": "init", "id": "a", "program": "hlm_standard",
+                                        "params": {"squat": 150, "pull": 180, "press": 80,
+                                                   "medium_reduction": 0.1, "light_reduction": 0.2}}))
+        full = websocket.receive_json()
+        websocket.send_text(json.dumps({"type": "patch", "id": "b", "params": {"press": 85}}))
+        diff = websocket.receive_json()
+        websocket.send_text("[1, 2]")
+        error = websocket.receive_json()
+    assert (full["type"], full["id"], diff["type"], diff["id"]) == ("full", "a", "diff", "b")
+    assert diff["ops"]
+    assert error == {"type": "error", "id": None, "status_code": 400, "detail": "Messages must be JSON objects."}
+
+
+def test_oversized_messages_close_the_connection(client):
+    with client.websocket_connect("/api/v1/live") as websocket:
+        websocket.send_text(" " * (main.LIVE_MAX_MESSAGE_BYTES + 1))
+        with pytest.raises(WebSocketDisconnect) as e:
+            websocket.receive_json()
+    assert e.value.code == 1009
+
+
+def test_unknown_origins_are_refused(client):
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect("/api/v1/live", headers={"Origin": "https://evil.example"}) as websocket:
+            websocket.receive_json()
+    assert e.value.code == 1008
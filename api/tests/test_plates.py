@@ -0,0 +1,59 @@
+import pytest
+
+from conftest import MAXES
+from main import PlateIndex
+
+INVENTORY = {
+    "bar_weight": 20,
+    "plates": [{"weight": 20, "count": 4}, {"weight": 10, "count": 2}, {"weight": 5, "count": 2}, {"weight": 2.5, "count": 2}]
+}
+
+
+def snap(client, weights, inventory=INVENTORY):
+    response = client.post("/api/v1/calcs/plates", json={"inventory": inventory, "weights": weights})
+    assert response.status_code == 200
+    return response.json()["loads"]
+
+
+def test_loadable_weight_is_kept(client):
+    assert snap(client, [125]) == [{"target": 125, "weight": 125.0, "plates": ["20kg", "20kg", "10kg", "2.5kg"]}]
+
+
+def test_weight_snaps_to_the_nearest_load_with_ties_going_lighter(client):
+    assert [load["weight"] for load in snap(client, [101, 102.5, 104])] == [100.0, 100.0, 105.0]
+
+
+def test_weights_outside_the_inventory_are_clamped(client):
+    assert [load["weight"] for load in snap(client, [0, 10, 500])] == [20.0, 20.0, 135.0]
+
+
+def test_fewest_plates_are_used():
+    index = PlateIndex(20, [("20kg", 20, 1), ("10kg", 10, 2), ("5kg", 5, 2)])
+    weights, loads = index.snap([60])
+    assert weights.tolist() == [60.0]
+    assert index.plates(int(loads[0])) == ["20kg"]
+
+
+def test_pound_plates_are_converted(client):
+    inventory = {"bar_weight": 45, "bar_unit": "lb", "plates": [{"weight": 45, "unit": "lb", "count": 2}]}
+    assert snap(client, [61.23], inventory) == [{"target": 61.23, "weight": 61.23, "plates": ["45lb"]}]
+
+
+def test_large_inventory_is_capped_per_side(client):
+    # More plates than fit on a bar are not an error; the extras are never used
+    inventory = {"bar_weight": 20, "plates": [{"weight": weight, "count": 1000} for weight in (25, 20, 10, 5, 2.5, 1.25)]}
+    assert [load["weight"] for load in snap(client, [100, 1000, 5000], inventory)] == [100.0, 1000.0, 1020.0]
+
+
+@pytest.mark.parametrize("plate", [{"weight": 0}, {"weight": -5}, {"weight": 5, "count": -2}])
+def test_non_positive_plates_are_rejected(client, plate):
+    response = client.post("/api/v1/calcs/plates", json={"inventory": {"plates": [plate]}, "weights": [100]})
+    assert response.status_code == 422
+
+
+def test_programs_snap_to_the_inventory(client):
+    response = client.post("/api/v1/programs/wendler531", json={**MAXES, "plates": INVENTORY})
+    assert response.status_code == 200
+    sets = [entry for week in response.json()["program"] for lift in week["lifts"] for entry in lift["sets"]]
+    loads = {load["weight"]: load["plates"] for load in snap(client, [20 + 2.5 * i for i in range(47)])}
+    assert all(loads[entry["weight"]] == entry["plates"] for entry in sets)
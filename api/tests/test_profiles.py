@@ -0,0 +1,73 @@
+import json
+
+import pytest
+
+from conftest import MAXES
+from main import OutputFormat, ProfileNotFound, ProfileStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / "profiles.db"), version="v1")
+
+
+def test_saved_program_matches_the_route(client, store):
+    store.save("ana", "wendler531", dict(MAXES, templates=["fsl"], fsl_params={"sets": 5, "reps": 5}))
+    route = client.post("/api/v1/programs/wendler531", json=dict(MAXES, templates=["fsl"], fsl_params={"sets": 5, "reps": 5}))
+    assert store.rendered("ana", "wendler531") == route.content
+    columnar = client.post("/api/v1/programs/wendler531?format=columnar", json=dict(MAXES, templates=["fsl"], fsl_params={"sets": 5, "reps": 5}))
+    assert json.loads(store.rendered("ana", "wendler531", OutputFormat.COLUMNAR)) == columnar.json()
+
+
+def test_merge_regenerates_only_changed_lifts(store):
+    assert store.save("ana", "wendler531", MAXES)["regenerated"] == ["squat", "bench", "deadlift", "press"]
+    saved = store.save("ana", "wendler531", {"bench": 102.5}, merge=True)
+    assert saved["regenerated"] == ["bench"]
+    assert saved["params"]["squat"] == MAXES["squat"]
+    assert store.save("ana", "wendler531", {"templates": ["pyramid"]}, merge=True)["regenerated"] == ["squat", "bench", "deadlift", "press"]
+
+
+def test_merge_needs_a_stored_profile(store):
+    with pytest.raises(ProfileNotFound):
+        store.save("ana", "wendler531", {"bench": 102.5}, merge=True)
+
+
+def test_new_generator_version_rebuilds_stored_programs(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    ProfileStore(path, version="v1").save("ana", "wendler531", MAXES)
+    store = ProfileStore(path, version="v2")
+    with store.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM rendered_programs").fetchone()[0] == 0
+    assert store.save("ana", "wendler531", {"press": 62.5}, merge=True)["regenerated"] == ["squat", "bench", "deadlift", "press"]
+    assert json.loads(store.rendered("ana", "wendler531"))["training_maxes"] == dict(MAXES, press=62.5)
+
+
+def test_delete_removes_everything(store):
+    store.save("ana", "hlm_standard", {"squat": 150, "pull": 180, "press": 80, "medium_reduction": 0.1, "light_reduction": 0.2})
+    assert store.delete("ana", "hlm_standard")
+    assert store.rendered("ana", "hlm_standard") is None
+    assert store.profiles("ana") == {}
+    assert not store.delete("ana", "hlm_standard")
+
+
+def test_profile_routes(client):
+    athlete = "route-athlete"
+    assert client.put(f"/api/v1/athletes/{athlete}/profile/wendler531", json=MAXES).status_code == 200
+    assert client.patch(f"/api/v1/athletes/{athlete}/profile/wendler531", json={"squat": 145.0}).json()["regenerated"] == ["squat"]
+    assert client.get(f"/api/v1/athletes/{athlete}/profile").json()["programs"]["wendler531"]["squat"] == 145.0
+    program = client.get(f"/api/v1/athletes/{athlete}/profile/wendler531/program")
+    assert program.content == client.post("/api/v1/programs/wendler531", json=dict(MAXES, squat=145.0)).content
+    assert client.delete(f"/api/v1/athletes/{athlete}/profile/wendler531").json()["deleted"]
+    assert client.get(f"/api/v1/athletes/{athlete}/profile/wendler531/program").status_code == 404
+
+
+@pytest.mark.parametrize("method, program, params, status_code", [
+    ("patch", "wendler531", {"squat": 145.0}, 404),
+    ("put", "wendler531", {"squat": "heavy"}, 422),
+    ("put", "wendler531", dict(MAXES, templates=["fsl"], fsl_params={"sets": 9, "reps": 5}), 400),
+    ("put", "madcow", MAXES, 400),
+])
+def test_rejected_profiles(client, method, program, params, status_code):
+    response = client.request(method, f"/api/v1/athletes/nobody/profile/{program}", json=params)
+    assert response.status_code == status_code
+    assert client.get("/api/v1/athletes/nobody/profile").json()["programs"] == {}
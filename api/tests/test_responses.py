@@ -0,0 +1,20 @@
+from conftest import MAXES
+
+
+def test_integers_beyond_64_bits_are_encoded(client):
+    response = client.post("/api/v1/echo", json={"a": 123456789012345678901234567890})
+    assert response.status_code == 200
+    assert response.json() == {"received_data": {"a": 123456789012345678901234567890}}
+
+
+def test_infinite_training_max_is_rejected(client):
+    params = {lift: 1e308 for lift in MAXES}
+    response = client.post("/api/v1/programs/wendler531", json=dict(params, max_type="onerm", tm_percentage=1000))
+    assert response.status_code == 400
+    assert response.json() == {"detail": "cannot convert float infinity to integer"}
+
+
+def test_infinite_training_max_fails_only_its_batch_entry(client):
+    athletes = [dict(MAXES, squat=1e308, max_type="onerm", tm_percentage=1000), MAXES]
+    results = client.post("/api/v1/programs/wendler531/batch", json={"athletes": athletes}).json()["results"]
+    assert [result["status_code"] for result in results] == [400, 200]